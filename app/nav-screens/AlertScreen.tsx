@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import {
   View, Text, Image, FlatList, TouchableOpacity,
   ActivityIndicator, RefreshControl, StyleSheet
@@ -12,6 +12,7 @@ export default function AlertScreen() {
   const [alerts, setAlerts] = useState([]);
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
+  const seqRef = useRef(null);
 
   const fetchAlerts = useCallback(async () => {
     try {
@@ -26,11 +27,61 @@ export default function AlertScreen() {
     }
   }, []);
 
+  const applyChanges = useCallback((changes) => {
+    setAlerts(current => {
+      let next = current;
+      for (const change of changes) {
+        const event = change.data;
+        if (change.kind === 'detection') {
+          next = [event, ...next.filter(a => a.id !== event.id)];
+        } else if (change.kind === 'detection_update') {
+          next = next.map(a => (a.id === event.id ? event : a));
+        }
+      }
+      return next;
+    });
+  }, []);
+
+  // New and updated detections arrive over the /events/poll long-poll, so an
+  // alert shows up as soon as the server records it rather than on a timer.
   useEffect(() => {
-    fetchAlerts();
-    const interval = setInterval(fetchAlerts, 10000);
-    return () => clearInterval(interval);
-  }, [fetchAlerts]);
+    let active = true;
+    const controller = new AbortController();
+    const wait = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+    const listen = async () => {
+      while (active) {
+        try {
+          if (seqRef.current === null) {
+            // Take the feed position before loading the list so nothing falls in between.
+            const res = await fetch(`${API_URL}/events/poll`, { signal: controller.signal });
+            seqRef.current = (await res.json()).seq;
+            await fetchAlerts();
+            continue;
+          }
+          const res = await fetch(`${API_URL}/events/poll?since=${seqRef.current}&timeout=25`,
+                                  { signal: controller.signal });
+          const data = await res.json();
+          if (data.status === 'resync') {
+            seqRef.current = null;
+            continue;
+          }
+          if (data.changes.length) applyChanges(data.changes);
+          seqRef.current = data.seq;
+        } catch (err) {
+          if (!active) return;
+          console.error('Event feed failed', err);
+          await wait(2000);
+        }
+      }
+    };
+
+    listen();
+    return () => {
+      active = false;
+      controller.abort();
+    };
+  }, [fetchAlerts, applyChanges]);
 
   const renderAlert = ({ item }) => (
     <TouchableOpacity
@@ -45,7 +96,7 @@ export default function AlertScreen() {
       })}
     >
       {item.image ? (
-        <Image source={{ uri: `${API_URL}${item.image}` }} style={styles.alertImage} />
+        <Image source={{ uri: `${API_URL}${item.thumbnail || item.image}` }} style={styles.alertImage} />
       ) : (
         <Ionicons name="person-circle" size={48} color="#555" />
       )}
@@ -65,7 +116,7 @@ export default function AlertScreen() {
       ) : (
         <FlatList
           data={alerts}
-          keyExtractor={item => item.timestamp}
+          keyExtractor={item => String(item.id ?? item.timestamp)}
           renderItem={renderAlert}
           refreshControl={<RefreshControl refreshing={refreshing} onRefresh={fetchAlerts} />}
         />
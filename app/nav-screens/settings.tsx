@@ -8,20 +8,35 @@ import { StatusBar } from 'expo-status-bar';
 
 const NGROK_URL = 'https://cerberus.ngrok.dev';
 
+type UserImage = { url: string; thumbnail: string; status: string };
+
 export default function Settings() {
-  const [users, setUsers] = useState<{ [name: string]: string[] }>({});
+  const [users, setUsers] = useState<{ [name: string]: UserImage[] }>({});
   const [loading, setLoading] = useState(true);
 
-  const fetchUsers = () => {
+  const fetchUsers = async () => {
     setLoading(true);
-    fetch(`${NGROK_URL}/users`)
-      .then((res) => res.json())
-      .then((data) => setUsers(data))
-      .catch((err) => {
-        console.error('Failed to fetch users', err);
-        Alert.alert('Error', 'Failed to fetch users');
-      })
-      .finally(() => setLoading(false));
+    try {
+      // /users is paginated; keep requesting pages until the last one.
+      const byName: { [name: string]: UserImage[] } = {};
+      let page = 1;
+      let pages = 1;
+      do {
+        const res = await fetch(`${NGROK_URL}/users?page=${page}&per_page=100`);
+        const data = await res.json();
+        data.users.forEach((user: { name: string; images: UserImage[] }) => {
+          byName[user.name] = user.images;
+        });
+        pages = data.pages;
+        page += 1;
+      } while (page <= pages);
+      setUsers(byName);
+    } catch (err) {
+      console.error('Failed to fetch users', err);
+      Alert.alert('Error', 'Failed to fetch users');
+    } finally {
+      setLoading(false);
+    }
   };
 
   useEffect(() => {
@@ -80,10 +95,10 @@ export default function Settings() {
                 </TouchableOpacity>
               </View>
               <ScrollView horizontal>
-                {images.map((url, i) => (
+                {images.map((image, i) => (
                   <Image
                     key={i}
-                    source={{ uri: `${NGROK_URL}${url}` }}
+                    source={{ uri: `${NGROK_URL}${image.thumbnail}` }}
                     style={tw`w-36 h-36 mr-2 rounded-lg border`}
                   />
                 ))}
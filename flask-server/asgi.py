@@ -0,0 +1,90 @@
+"""Production entry point: the same server on an asyncio event loop.
+
+    pip install uvicorn starlette a2wsgi
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 1
+
+/video_feed, /events and /events/poll are coroutines fed by the frame
+broadcasters and the change feed, so an open stream costs a socket rather
+than a thread. Every other route is the unchanged Flask app running on a
+bounded thread pool, which is also where the blocking fingerprint, GPIO and
+SQLite calls happen. Use a single worker: cameras, the lock and the sensor
+belong to one process.
+"""
+import os
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import server
+
+WSGI_THREADS = int(os.environ.get("WSGI_THREADS", 16))
+CORS_HEADERS = {"Access-Control-Allow-Origin": "*", "Access-Control-Allow-Headers": "Content-Type"}
+
+
+def camera_not_found(name):
+    return JSONResponse({"status": "error", "message": f"Unknown camera '{name}'"}, status_code=404,
+                        headers=CORS_HEADERS)
+
+
+async def video_feed(request):
+    name = request.path_params.get("name")
+    cam = server.get_camera(name)
+    if cam is None:
+        return camera_not_found(name)
+    query = request.query_params
+    try:
+        tier = cam.broadcaster.resolve_tier(query.get("tier"), query.get("width"), query.get("quality"), query.get("fps"))
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400, headers=CORS_HEADERS)
+    return StreamingResponse(cam.broadcaster.astream(tier), media_type="multipart/x-mixed-replace; boundary=frame",
+                             headers=CORS_HEADERS)
+
+
+async def events_stream(request):
+    since = request.headers.get("last-event-id", request.query_params.get("since"))
+    seq = int(since) if since and since.isdigit() else server.change_feed.seq
+    headers = dict(CORS_HEADERS, **{"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return StreamingResponse(server.change_feed.asse(seq), media_type="text/event-stream", headers=headers)
+
+
+async def events_poll(request):
+    since = request.query_params.get("since")
+    if since is None or not since.isdigit():
+        with server.pending_lock:
+            status = server.auth_status_payload(server.pending_verification)
+        body = {"status": "success", "seq": server.change_feed.seq, "changes": [], "auth_status": status}
+        return JSONResponse(body, headers=CORS_HEADERS)
+    since = int(since)
+    try:
+        timeout = min(float(request.query_params.get("timeout", 25)), 60)
+    except ValueError:
+        timeout = 25
+    changes = await server.change_feed.async_wait(since, timeout)
+    if changes is None:
+        body = {"status": "resync", "seq": server.change_feed.seq, "changes": []}
+    else:
+        body = {"status": "success", "seq": changes[-1]["seq"] if changes else since, "changes": changes}
+    return JSONResponse(body, headers=CORS_HEADERS)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    server.start_background_workers()
+    yield
+
+
+flask_app = WSGIMiddleware(server.app, workers=WSGI_THREADS)
+
+app = Starlette(
+    routes=[
+        Route("/video_feed", video_feed),
+        Route("/video_feed/{name}", video_feed),
+        Route("/events", events_stream),
+        Route("/events/poll", events_poll),
+        Mount("/", app=flask_app),
+    ],
+    lifespan=lifespan,
+)
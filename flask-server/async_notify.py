@@ -0,0 +1,48 @@
+import asyncio
+from threading import Lock
+
+
+def _resolve(fut):
+    if not fut.done():
+        fut.set_result(None)
+
+
+class AsyncNotifier:
+    """Wakes coroutines from plain threads, so an event loop can wait on
+    state that capture and worker threads update.
+
+    Call add() while holding the lock that guards that state, after seeing
+    nothing new, and notify_all() under the same lock when it changes; then
+    no wake-up can fall between the check and the wait.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._waiters = {}
+
+    def add(self):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._lock:
+            self._waiters[fut] = loop
+        return fut
+
+    async def wait(self, fut, timeout):
+        """True when notified, False on timeout."""
+        try:
+            await asyncio.wait_for(fut, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.pop(fut, None)
+
+    def notify_all(self):
+        with self._lock:
+            waiters, self._waiters = self._waiters, {}
+        for fut, loop in waiters.items():
+            try:
+                loop.call_soon_threadsafe(_resolve, fut)
+            except RuntimeError:
+                pass  # the loop has shut down
@@ -0,0 +1,247 @@
+"""Replays a recording through the full server pipeline on simulated hardware
+and reports throughput, latency and resource use.
+
+    python benchmark.py --source clip.mp4 --duration 60 --json report.json
+
+The camera replays --source at its own frame rate, the lock pin is in memory
+and the fingerprint sensor presents the recognised person's finger
+--finger-delay seconds after the face is matched. Runs in a scratch copy of
+the working directory so events, snapshots and clips don't touch the real ones.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from threading import Thread
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILES = ("encodings.json", "encodings.*.npy", "encodings.pickle", "encoding_cache.json")
+IDLE_GAP = 2.0
+
+
+def summarize(samples, scale=1000.0):
+    values = sorted(samples)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * scale, 1),
+        "p50_ms": round(values[len(values) // 2] * scale, 1),
+        "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * scale, 1),
+        "max_ms": round(values[-1] * scale, 1),
+    }
+
+
+def process_tree(pid):
+    # The recognition pool runs in forked children; count them with the server.
+    pids = [pid]
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            if int(fields[1]) == pid:
+                pids.append(int(entry))
+    return pids
+
+
+def cpu_seconds(pids):
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += int(fields[11]) + int(fields[12])
+        except OSError:
+            pass
+    return total / os.sysconf("SC_CLK_TCK")
+
+
+def rss_mb(pids):
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024.0
+
+
+def prepare_workdir(workdir):
+    os.makedirs(workdir, exist_ok=True)
+    for pattern in STATE_FILES:
+        for src in glob.glob(os.path.join(SERVER_DIR, pattern)):
+            shutil.copy2(src, workdir)
+    dataset = os.path.join(SERVER_DIR, "dataset")
+    if os.path.isdir(dataset) and not os.path.exists(os.path.join(workdir, "dataset")):
+        os.symlink(dataset, os.path.join(workdir, "dataset"))
+
+
+def timed(fn, samples):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - started)
+    return wrapper
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--source", required=True, help="video file or directory of images")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--finger-delay", type=float, default=1.0)
+    parser.add_argument("--viewers", type=int, default=1, help="simulated /video_feed clients")
+    parser.add_argument("--workdir", help="defaults to a temporary directory")
+    parser.add_argument("--json", help="also write the report here")
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    workdir = args.workdir or tempfile.mkdtemp(prefix="securityapp-bench-")
+    prepare_workdir(workdir)
+    os.environ.setdefault("HARDWARE_BACKEND", "sim")
+    os.environ["CAMERA_SOURCE"] = os.path.abspath(args.source)
+    os.chdir(workdir)
+    sys.path.insert(0, SERVER_DIR)
+
+    import server
+    from face_index import UNKNOWN
+    from fingerprint_sensor import FakeFingerprint
+
+    # Enrol one finger per known person so every recognition can complete.
+    people = sorted(set(server.encoding_store.load()[1]) - {UNKNOWN})
+    slots = {slot: name for slot, name in enumerate(people, start=1)}
+    server.fingerprint_map = {str(slot): name for slot, name in slots.items()}
+    device = FakeFingerprint(slots)
+    server.fingerprint_sensor.factory = lambda: device
+
+    # Measures the default camera; the replayed source feeds only that one.
+    cam = server.get_camera()
+    motion_times = []
+    cam.motion.process = timed(cam.motion.process, motion_times)
+    encode_times = []
+    cam.broadcaster._compress = timed(cam.broadcaster._compress, encode_times)
+
+    launched = time.time()
+    server.start_background_workers()
+    pid = os.getpid()
+    while not all(server.startup_phases.values()) and time.time() - launched < 300:
+        time.sleep(0.1)
+    startup = time.time() - launched
+
+    viewer_frames = [0] * args.viewers
+
+    def viewer(index):
+        for _ in cam.broadcaster.stream():
+            viewer_frames[index] += 1
+
+    for index in range(args.viewers):
+        Thread(target=viewer, args=(index,), daemon=True).start()
+
+    motion_starts, recognitions = [], []
+
+    def watch_motion():
+        seq, last = 0, 0.0
+        while True:
+            with cam.motion_cond:
+                cam.motion_cond.wait_for(lambda: cam.motion_seq > seq, timeout=1.0)
+                seq = cam.motion_seq
+            now = time.time()
+            if now - last > IDLE_GAP:
+                motion_starts.append(now)
+            last = now
+
+    def present_fingers():
+        seq = server.change_feed.seq
+        while True:
+            changes = server.change_feed.wait(seq, 1.0)
+            if changes is None:
+                seq = server.change_feed.seq
+                continue
+            for change in changes:
+                seq = change["seq"]
+                data = change["data"]
+                if change["kind"] == "auth_status" and data.get("awaiting_fingerprint"):
+                    recognitions.append(change["time"])
+                    time.sleep(args.finger_delay)
+                    device.place_finger(data["name"])
+                    time.sleep(1.0)
+                    device.remove_finger()
+
+    Thread(target=watch_motion, daemon=True).start()
+    Thread(target=present_fingers, daemon=True).start()
+
+    print(f"Warming up for {args.warmup:.0f}s in {workdir}", file=sys.stderr)
+    time.sleep(args.warmup)
+    del motion_times[:], encode_times[:]
+    viewer_frames[:] = [0] * args.viewers
+    started = time.time()
+    bus_seq = cam.bus.seq
+    camera_frames = getattr(cam.camera, "frames_read", 0)
+    cpu_start = cpu_seconds(process_tree(pid))
+    peak_rss = 0.0
+
+    print(f"Measuring for {args.duration:.0f}s", file=sys.stderr)
+    while time.time() - started < args.duration:
+        time.sleep(1.0)
+        peak_rss = max(peak_rss, rss_mb(process_tree(pid)))
+
+    elapsed = time.time() - started
+    cpu = cpu_seconds(process_tree(pid)) - cpu_start
+    unlocks = [t for t, pin, value in getattr(server.GPIO, "history", [])
+               if pin == server.LOCK_GPIO_PIN and value == 0 and t >= started]
+
+    def since_previous(events, marks):
+        deltas = []
+        for t in events:
+            earlier = [m for m in marks if m <= t]
+            if earlier:
+                deltas.append(t - earlier[-1])
+        return deltas
+
+    window = [t for t in recognitions if t >= started]
+    report = {
+        "source": args.source,
+        "duration_s": round(elapsed, 1),
+        "startup_s": round(startup, 2),
+        "startup_phases": dict(server.startup_phases),
+        "fps": {
+            "camera": round((getattr(cam.camera, "frames_read", 0) - camera_frames) / elapsed, 1),
+            "capture": round((cam.bus.seq - bus_seq) / elapsed, 1),
+            "stream_encode": round(len(encode_times) / elapsed, 1),
+            "stream_viewers": [round(n / elapsed, 1) for n in viewer_frames],
+        },
+        "motion_detection": summarize(motion_times),
+        "jpeg_encode": summarize(encode_times),
+        "recognition_latency": summarize(since_previous(window, motion_starts), 1000.0),
+        "time_to_unlock": summarize(since_previous(unlocks, motion_starts), 1000.0),
+        "unlock_after_recognition": summarize(since_previous(unlocks, recognitions), 1000.0),
+        "finger_delay_s": args.finger_delay,
+        "recognitions": len(window),
+        "unlocks": len(unlocks),
+        "skipped_recognition_frames": server.recognition_engine.skipped_frames,
+        "stream_dropped_frames": cam.broadcaster.dropped_frames,
+        "recorder": cam.recorder.stats(),
+        "cpu_percent": round(cpu / elapsed * 100, 1),
+        "peak_rss_mb": round(peak_rss, 1),
+    }
+    print(json.dumps(report, indent=2))
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+import logging
+import time
+from threading import Condition, Thread
+
+import cv2
+
+from async_notify import AsyncNotifier
+
+logger = logging.getLogger(__name__)
+
+BOUNDARY_PREFIX = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
+# Stream tiers as (width, quality, fps). None means the broadcaster's own
+# setting, so "high" is the full-size stream every viewer got before tiers.
+TIERS = {
+    "high": (None, None, None),
+    "medium": (480, 40, 12),
+    "low": (320, 30, 6),
+}
+DEFAULT_TIER = "high"
+# Tiers an "auto" viewer moves between, worst first, and where it starts.
+AUTO_ORDER = ("low", "medium", "high")
+AUTO_START = "medium"
+# Explicit ?width=&quality=&fps= are snapped to these, so viewers asking for
+# nearly the same thing share one encoder output instead of one each.
+TIER_WIDTHS = (160, 240, 320, 480, 640)
+TIER_FPS = (2, 4, 6, 8, 10, 12, 15, 20, 25, 30)
+
+
+def _snap(value, choices):
+    return min(choices, key=lambda c: abs(c - value))
+
+
+class StreamTier:
+    """One encoded output of the broadcaster, shared by every viewer on it."""
+
+    def __init__(self, name, width, quality, fps):
+        self.name = name
+        self.width = width
+        self.quality = quality
+        self.fps = fps
+        self.interval = 1.0 / fps
+        self.viewers = 0
+        self.encoded = 0
+        self.frame_no = 0
+        self.seq = 0
+        self.jpeg = None
+        self.stamp = 0.0
+        self.next_due = 0.0
+
+
+class TierSelector:
+    """Moves an "auto" viewer between tiers by how fast its client drains.
+
+    A yield blocks for as long as the socket write takes, so a client that
+    spends most of a frame interval there is falling behind and drops a tier;
+    one that spends almost none of it for a while moves back up.
+    """
+
+    def __init__(self, order=AUTO_ORDER, start=AUTO_START, down_at=0.8, up_at=0.25, settle=4.0, hold=10.0):
+        self.order = order
+        self.index = order.index(start)
+        self.down_at = down_at
+        self.up_at = up_at
+        # Seconds to ignore after a switch, and to stay idle before going up.
+        self.settle = settle
+        self.hold = hold
+        self._reset(time.time())
+
+    def _reset(self, now):
+        self.load = None
+        self.changed = now
+        self.idle_since = None
+
+    @property
+    def tier(self):
+        return self.order[self.index]
+
+    def update(self, send_seconds, interval):
+        now = time.time()
+        load = send_seconds / interval
+        self.load = load if self.load is None else 0.8 * self.load + 0.2 * load
+        if now - self.changed < self.settle:
+            return self.tier
+        if self.load > self.down_at and self.index > 0:
+            self.index -= 1
+            self._reset(now)
+        elif self.load < self.up_at and self.index < len(self.order) - 1:
+            if self.idle_since is None:
+                self.idle_since = now
+            elif now - self.idle_since >= self.hold:
+                self.index += 1
+                self._reset(now)
+        else:
+            self.idle_since = None
+        return self.tier
+
+
+class _Viewer:
+    """One stream client's place on a tier. Call take() under the broadcaster's lock."""
+
+    def __init__(self, broadcaster, tier):
+        self.broadcaster = broadcaster
+        self.selector = TierSelector() if tier == "auto" else None
+        self.tier = None
+        self.last_no = 0
+        self._join(self.selector.tier if self.selector else tier)
+
+    def _join(self, name):
+        b = self.broadcaster
+        with b._cond:
+            if self.tier is not None:
+                self.tier.viewers -= 1
+            self.tier = b.tiers[name]
+            self.tier.viewers += 1
+            # Whatever the tier holds may be from before anyone watched it.
+            self.last_no = self.tier.frame_no
+            b._cond.notify_all()
+
+    def close(self):
+        with self.broadcaster._cond:
+            self.tier.viewers -= 1
+            self.broadcaster._cond.notify_all()
+
+    def ready(self):
+        return self.tier.frame_no > self.last_no
+
+    def take(self):
+        frame_no, jpeg = self.tier.frame_no, self.tier.jpeg
+        if jpeg is None or frame_no == self.last_no:
+            return None
+        # A slow client only ever gets the newest frame; anything it
+        # missed while blocked on the socket is skipped, not queued.
+        if self.last_no and frame_no > self.last_no + 1:
+            self.broadcaster.dropped_frames += frame_no - self.last_no - 1
+        self.last_no = frame_no
+        return BOUNDARY_PREFIX + jpeg + b'\r\n'
+
+    def sent(self, seconds):
+        if self.selector is None:
+            return
+        name = self.selector.update(seconds, self.tier.interval)
+        if name != self.tier.name:
+            self._join(name)
+
+
+class MjpegBroadcaster:
+    """Encodes each bus frame to JPEG once per stream tier and shares the bytes
+    with every viewer on that tier."""
+
+    def __init__(self, frame_bus, quality=50, fps=20, idle_fps=None):
+        self.frame_bus = frame_bus
+        self.quality = quality
+        self.fps = fps
+        # Encoding rate kept up for sinks while nobody is watching the stream.
+        self.idle_interval = 1.0 / idle_fps if idle_fps else None
+        # Called as sink(seq, jpeg, stamp) for every full-size encoded frame.
+        self.sinks = []
+        # Called as observe(stage, seconds) with per-frame timings.
+        self.observe = None
+        self.dropped_frames = 0
+        self.tiers = {}
+        for name in TIERS:
+            self._add_tier(name, *self._tier_settings(name))
+        self._default = self.tiers[DEFAULT_TIER]
+        self._cond = Condition()
+        self._async = AsyncNotifier()
+        self._thread = None
+
+    def _tier_settings(self, name):
+        width, quality, fps = TIERS[name]
+        return width, quality or self.quality, min(fps or self.fps, self.fps)
+
+    def _add_tier(self, name, width, quality, fps):
+        if name not in self.tiers:
+            self.tiers[name] = StreamTier(name, width, quality, fps)
+        return name
+
+    def resolve_tier(self, tier=None, width=None, quality=None, fps=None):
+        """Tier name for a /video_feed request: a named tier, "auto", or the
+        named tier (default "high") with width/quality/fps overridden. Raises
+        ValueError for anything it can't serve."""
+        tier = tier or DEFAULT_TIER
+        if tier != "auto" and tier not in TIERS:
+            raise ValueError(f"Unknown tier '{tier}', expected one of {', '.join(list(TIERS) + ['auto'])}")
+        if width is None and quality is None and fps is None:
+            return tier
+        if tier == "auto":
+            raise ValueError("tier=auto picks its own width, quality and fps")
+        settings = list(self._tier_settings(tier))
+        try:
+            if width is not None:
+                width = _snap(int(width), TIER_WIDTHS)
+                settings[0] = None if width >= max(TIER_WIDTHS) else width
+            if quality is not None:
+                settings[1] = min(90, max(20, round(int(quality), -1)))
+            if fps is not None:
+                settings[2] = _snap(min(float(fps), self.fps), [f for f in TIER_FPS if f <= self.fps] or [self.fps])
+        except ValueError:
+            raise ValueError("width, quality and fps must be numbers")
+        with self._cond:
+            for name in TIERS:
+                if list(self._tier_settings(name)) == settings:
+                    return name
+            width, quality, fps = settings
+            return self._add_tier(f"{width or 'full'}w-q{quality}-{fps}fps", width, quality, fps)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _convert(self, frame):
+        started = time.perf_counter()
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if self.observe:
+            self.observe("colour_convert", time.perf_counter() - started)
+        return frame_rgb
+
+    def _resize(self, frame_rgb, width):
+        height, full_width = frame_rgb.shape[:2]
+        if width is None or width >= full_width:
+            return frame_rgb
+        started = time.perf_counter()
+        scaled = cv2.resize(frame_rgb, (width, height * width // full_width), interpolation=cv2.INTER_AREA)
+        if self.observe:
+            self.observe("stream_resize", time.perf_counter() - started)
+        return scaled
+
+    def _compress(self, frame_rgb, quality):
+        started = time.perf_counter()
+        ret, buffer = cv2.imencode('.jpg', frame_rgb, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        if self.observe:
+            self.observe("jpeg_encode", time.perf_counter() - started)
+        return buffer.tobytes() if ret else None
+
+    def _store(self, tier, seq, jpeg, stamp):
+        with self._cond:
+            tier.seq, tier.jpeg, tier.stamp = seq, jpeg, stamp
+            tier.frame_no += 1
+            tier.encoded += 1
+            self._cond.notify_all()
+            self._async.notify_all()
+        if tier is not self._default:
+            return
+        for sink in self.sinks:
+            try:
+                sink(seq, jpeg, stamp)
+            except Exception as e:
+                logger.error(f"Frame sink error: {e}")
+
+    def _interval(self, tier):
+        """Seconds between encodes of `tier`, or None when nothing needs it."""
+        if tier.viewers > 0:
+            return tier.interval
+        if tier is self._default and self.sinks:
+            return self.idle_interval
+        return None
+
+    def _active(self):
+        return any(self._interval(t) for t in self.tiers.values())
+
+    def _next_due(self):
+        with self._cond:
+            due = [t.next_due for t in self.tiers.values() if self._interval(t)]
+        return min(due, default=time.time())
+
+    def _encode_due(self, seq, frame, stamp):
+        now = time.time()
+        with self._cond:
+            due = []
+            for tier in self.tiers.values():
+                interval = self._interval(tier)
+                if interval and now >= tier.next_due:
+                    tier.next_due = max(tier.next_due + interval, now)
+                    due.append(tier)
+        if not due:
+            return
+        # Colour conversion and each resize happen once per frame however
+        # many tiers and viewers use them.
+        frame_rgb = self._convert(frame)
+        if not self.frame_bus.is_current(seq):
+            # The capture thread lapped us mid-conversion.
+            self.dropped_frames += 1
+            return
+        scaled = {}
+        for tier in due:
+            if tier.width not in scaled:
+                scaled[tier.width] = self._resize(frame_rgb, tier.width)
+            jpeg = self._compress(scaled[tier.width], tier.quality)
+            if jpeg:
+                self._store(tier, seq, jpeg, stamp)
+
+    def _run(self):
+        last_seq = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(self._active, timeout=1.0)
+                if not self._active():
+                    continue
+            try:
+                seq, frame, stamp = self.frame_bus.wait(last_seq)
+                if frame is None or seq == last_seq:
+                    continue
+                last_seq = seq
+                self._encode_due(seq, frame, stamp)
+            except Exception as e:
+                logger.error(f"Frame encode error: {e}")
+                time.sleep(1)
+            time.sleep(max(0.0, self._next_due() - time.time()))
+
+    @property
+    def subscribers(self):
+        return sum(t.viewers for t in self.tiers.values())
+
+    def tier_stats(self):
+        """Named tiers, plus custom ones while someone is watching them."""
+        with self._cond:
+            return {
+                name: {"width": t.width, "quality": t.quality, "fps": t.fps, "viewers": t.viewers, "encoded": t.encoded}
+                for name, t in self.tiers.items() if name in TIERS or t.viewers
+            }
+
+    def latest(self):
+        with self._cond:
+            return self._default.seq, self._default.jpeg, self._default.stamp
+
+    def snapshot(self, max_age=1.0):
+        seq, jpeg, stamp = self.latest()
+        if jpeg is not None and time.time() - stamp <= max_age:
+            return jpeg
+        # Nobody is streaming, so the cache is stale; encode the newest frame once.
+        seq, frame, stamp = self.frame_bus.latest()
+        if frame is None:
+            return jpeg
+        frame_rgb = self._convert(frame)
+        if not self.frame_bus.is_current(seq):
+            return jpeg
+        jpeg = self._compress(frame_rgb, self._default.quality)
+        if jpeg:
+            self._store(self._default, seq, jpeg, stamp)
+        return jpeg
+
+    def stream(self, tier=DEFAULT_TIER):
+        viewer = _Viewer(self, tier)
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(viewer.ready, timeout=1.0)
+                    chunk = viewer.take()
+                if chunk is None:
+                    continue
+                started = time.time()
+                yield chunk
+                viewer.sent(time.time() - started)
+        finally:
+            viewer.close()
+
+    async def astream(self, tier=DEFAULT_TIER):
+        """stream() for an event loop: a viewer is a coroutine, not a thread.
+        While the socket is backed up the coroutine sits at the yield, so it
+        resumes on the newest frame like the threaded version."""
+        viewer = _Viewer(self, tier)
+        try:
+            while True:
+                with self._cond:
+                    chunk = viewer.take()
+                    fut = self._async.add() if chunk is None else None
+                if fut is not None:
+                    await self._async.wait(fut, 1.0)
+                    continue
+                started = time.time()
+                yield chunk
+                viewer.sent(time.time() - started)
+        finally:
+            viewer.close()
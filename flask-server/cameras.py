@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+from threading import Condition
+
+from broadcaster import MjpegBroadcaster
+from dvr import SegmentRecorder
+from frame_bus import FrameBus
+from hardware import open_camera
+from motion import MotionDetector
+from preroll import PrerollBuffer
+from recorder import ClipRecorder
+
+logger = logging.getLogger(__name__)
+
+
+class CameraPipeline:
+    """Everything that exists once per camera: capture bus, stream encoder,
+    pre-roll, motion detector, clip recorder, face tracker and, with a
+    segment index, the DVR recorder."""
+
+    def __init__(self, name, backend, source=None, size=(640, 480), record_fps=10, pre_roll=5.0,
+                 post_roll=5.0, decode=None, motion_config=None, tracker=None, clips_dir="static/videos",
+                 segment_index=None, segment_seconds=60):
+        self.name = name
+        self.backend = backend
+        self.source = source
+        self.size = tuple(size)
+        self.camera = None
+        self.available = False
+        self.bus = FrameBus(slots=8)
+        self.broadcaster = MjpegBroadcaster(self.bus, quality=50, fps=20, idle_fps=record_fps)
+        self.preroll = PrerollBuffer(seconds=pre_roll, fps=record_fps)
+        self.broadcaster.sinks.append(self.preroll.add)
+        self.recorder = ClipRecorder(clips_dir, fps=record_fps, codec="mp4v", post_roll=post_roll, decode=decode)
+        self.preroll.on_frame = lambda jpeg, stamp: self.recorder.add_frame(jpeg)
+        self.dvr = None
+        if segment_index is not None:
+            self.dvr = SegmentRecorder(segment_index, name, segment_seconds=segment_seconds, fps=record_fps)
+            self.broadcaster.sinks.append(self.dvr.add)
+        config = motion_config or {}
+        self.motion = MotionDetector(width=160, sensitivity=config.get("sensitivity", 0.5), zones=config.get("zones"))
+        self.tracker = tracker
+        self.motion_cond = Condition()
+        self.motion_seq = 0
+        self.motion_regions = []
+
+    def open(self):
+        try:
+            self.camera = open_camera(self.backend, source=self.source, size=self.size)
+            self.available = True
+            logger.info(f"Camera {self.name} initialized ({self.backend})")
+        except Exception as e:
+            logger.error(f"Camera {self.name} init failed: {e}")
+            self.available = False
+        return self.available
+
+    def publish_motion(self, boxes):
+        with self.motion_cond:
+            self.motion_seq += 1
+            self.motion_regions = boxes
+            self.motion_cond.notify_all()
+
+    def status(self):
+        return {
+            "name": self.name,
+            "backend": self.backend,
+            "available": self.available,
+            "stream": f"/video_feed/{self.name}",
+            "viewers": self.broadcaster.subscribers,
+            "tiers": self.broadcaster.tier_stats(),
+            "recorder": self.recorder.stats(),
+            "preroll": self.preroll.stats(),
+            "dvr": self.dvr.stats() if self.dvr else None,
+        }
+
+
+def load_camera_config(path, default):
+    """Camera definitions from `path` (a JSON list of {name, backend, source,
+    size}), or the single `default` camera when the file doesn't exist."""
+    if not os.path.exists(path):
+        return [default]
+    with open(path, "r") as f:
+        cameras = json.load(f)
+    names = [c["name"] for c in cameras]
+    if not cameras or len(set(names)) != len(names):
+        raise ValueError(f"{path} needs at least one camera and unique names")
+    return cameras
@@ -0,0 +1,86 @@
+import json
+import time
+from collections import deque
+from threading import Condition
+
+from async_notify import AsyncNotifier
+
+
+class ChangeFeed:
+    """Sequenced in-memory log of recent changes that clients can resume from."""
+
+    def __init__(self, maxlen=1000):
+        self._log = deque(maxlen=maxlen)
+        self._seq = 0
+        self._cond = Condition()
+        self._async = AsyncNotifier()
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def publish(self, kind, payload):
+        with self._cond:
+            self._seq += 1
+            self._log.append({"seq": self._seq, "kind": kind, "time": time.time(), "data": payload})
+            self._cond.notify_all()
+            self._async.notify_all()
+            return self._seq
+
+    def since(self, seq):
+        """Changes after `seq`, or None when they have already been evicted,
+        or `seq` is from before a server restart, and the client has to
+        resync from the REST endpoints."""
+        with self._cond:
+            return self._since(seq)
+
+    def _since(self, seq):
+        # The counter restarts at 0 with the process, so a position past it
+        # came from an earlier run.
+        if seq > self._seq:
+            return None
+        if seq == self._seq:
+            return []
+        if self._log and seq < self._log[0]["seq"] - 1:
+            return None
+        return [c for c in self._log if c["seq"] > seq]
+
+    def wait(self, seq, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != seq, timeout)
+            return self._since(seq)
+
+    async def async_wait(self, seq, timeout):
+        """wait() for an event loop; suspends the coroutine instead of a thread."""
+        with self._cond:
+            changes = self._since(seq)
+            fut = self._async.add() if changes == [] else None
+        if fut is None or not await self._async.wait(fut, timeout):
+            return changes
+        with self._cond:
+            return self._since(seq)
+
+    def _sse_chunk(self, seq, changes):
+        # The seq goes out as the event id so a reconnecting EventSource
+        # resumes via Last-Event-ID.
+        if changes is None:
+            seq = self._seq
+            return seq, f"id: {seq}\nevent: resync\ndata: {{}}\n\n"
+        if not changes:
+            return seq, ": keep-alive\n\n"
+        chunk = "".join(
+            f"id: {c['seq']}\nevent: {c['kind']}\ndata: {json.dumps(c['data'])}\n\n" for c in changes)
+        return changes[-1]["seq"], chunk
+
+    def sse(self, seq, heartbeat=15.0):
+        # Server-Sent Events stream.
+        yield "retry: 2000\n\n"
+        while True:
+            seq, chunk = self._sse_chunk(seq, self.wait(seq, heartbeat))
+            yield chunk
+
+    async def asse(self, seq, heartbeat=15.0):
+        yield "retry: 2000\n\n"
+        while True:
+            seq, chunk = self._sse_chunk(seq, await self.async_wait(seq, heartbeat))
+            yield chunk
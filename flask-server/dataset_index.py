@@ -0,0 +1,52 @@
+import os
+from threading import Lock
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class DatasetIndex:
+    """In-memory listing of dataset/<person>/<image>, revalidated by directory mtime."""
+
+    def __init__(self, root="dataset"):
+        self.root = root
+        self._lock = Lock()
+        self._root_mtime = None
+        self._people = {}
+
+    def _scan_person(self, name):
+        path = os.path.join(self.root, name)
+        mtime = os.stat(path).st_mtime_ns
+        images = sorted(f for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTENSIONS))
+        self._people[name] = {"mtime_ns": mtime, "images": images}
+
+    def refresh(self):
+        with self._lock:
+            # Adding or removing a person changes the root's mtime; adding or
+            # removing an image changes that person's directory mtime.
+            root_mtime = os.stat(self.root).st_mtime_ns
+            if root_mtime != self._root_mtime:
+                names = {d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d))}
+                for name in set(self._people) - names:
+                    del self._people[name]
+                for name in names - set(self._people):
+                    self._scan_person(name)
+                self._root_mtime = root_mtime
+            for name, info in list(self._people.items()):
+                try:
+                    if os.stat(os.path.join(self.root, name)).st_mtime_ns != info["mtime_ns"]:
+                        self._scan_person(name)
+                except FileNotFoundError:
+                    del self._people[name]
+
+    def invalidate(self, name=None):
+        # Writes can land within the filesystem's mtime granularity, so the
+        # endpoints that change the dataset force a rescan explicitly.
+        with self._lock:
+            self._root_mtime = None
+            if name in self._people:
+                self._people[name]["mtime_ns"] = None
+
+    def people(self):
+        self.refresh()
+        with self._lock:
+            return {name: list(info["images"]) for name, info in sorted(self._people.items())}
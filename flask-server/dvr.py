@@ -0,0 +1,340 @@
+import logging
+import os
+import queue
+import sqlite3
+import struct
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    camera TEXT NOT NULL,
+    path TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL,
+    frames INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_segments_camera ON segments(camera, start);
+CREATE INDEX IF NOT EXISTS idx_segments_end ON segments(end);
+"""
+
+# One entry per frame in a segment's .idx file: capture time, then the byte
+# offset and length of that frame's JPEG in the .mjpeg file.
+INDEX_ENTRY = struct.Struct("<dQI")
+
+
+def index_path(path):
+    return os.path.splitext(path)[0] + ".idx"
+
+
+def read_index(path):
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    # A power cut can leave half an entry at the end.
+    return list(INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) % INDEX_ENTRY.size]))
+
+
+class SegmentIndex:
+    """Which DVR segments exist for each camera and the time span each covers."""
+
+    def __init__(self, directory="dvr"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "segments.db")
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        self._recover()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _recover(self):
+        # Segments still open after a crash end at their last indexed frame.
+        for row in self._conn().execute("SELECT * FROM segments WHERE end IS NULL").fetchall():
+            entries = read_index(index_path(row["path"]))
+            if not entries:
+                self.remove(row)
+                continue
+            stamp, offset, length = entries[-1]
+            self.close(row["id"], stamp, len(entries), offset + length)
+            logger.info(f"Recovered DVR segment {row['path']} ({len(entries)} frames)")
+
+    def segment_path(self, camera, start, attempt=0):
+        name = datetime.fromtimestamp(start).strftime("%Y%m%d-%H%M%S-%f")
+        suffix = f"-{attempt}" if attempt else ""
+        return os.path.join(self.directory, camera, f"{name}{suffix}.mjpeg")
+
+    def open(self, camera, path, start):
+        with self._conn() as conn:
+            cur = conn.execute("INSERT INTO segments (camera, path, start) VALUES (?, ?, ?)", (camera, path, start))
+        return cur.lastrowid
+
+    def close(self, segment_id, end, frames, size):
+        with self._conn() as conn:
+            conn.execute("UPDATE segments SET end = ?, frames = ?, bytes = ? WHERE id = ?",
+                         (end, frames, size, segment_id))
+
+    def remove(self, row):
+        for path in (row["path"], index_path(row["path"])):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._conn() as conn:
+            conn.execute("DELETE FROM segments WHERE id = ?", (row["id"],))
+
+    def closed(self):
+        """Finished segments, oldest first; the open ones are still being written."""
+        return self._conn().execute("SELECT * FROM segments WHERE end IS NOT NULL ORDER BY end").fetchall()
+
+    def files(self):
+        """Finished segments as retention items: (end time, size, remove, path)."""
+        return [(row["end"], row["bytes"] + row["frames"] * INDEX_ENTRY.size, lambda row=row: self.remove(row),
+                 row["path"]) for row in self.closed()]
+
+    def coverage(self, camera):
+        row = self._conn().execute(
+            "SELECT COUNT(*) AS n, MIN(start) AS first, MAX(COALESCE(end, start)) AS last FROM segments WHERE camera = ?",
+            (camera,)).fetchone()
+        return {"segments": row["n"], "from": row["first"], "to": row["last"]}
+
+    def find_clip(self, camera, start, end):
+        """The frames captured between start and end, in order, as
+        (segment path, [(offset, length), ...]) parts."""
+        rows = self._conn().execute(
+            "SELECT * FROM segments WHERE camera = ? AND start <= ? AND (end IS NULL OR end >= ?) ORDER BY start",
+            (camera, end, start)).fetchall()
+        parts, frames, first, last = [], 0, None, None
+        for row in rows:
+            entries = [e for e in read_index(index_path(row["path"])) if start <= e[0] <= end]
+            if not entries:
+                continue
+            parts.append((row["path"], [(offset, length) for _, offset, length in entries]))
+            frames += len(entries)
+            first = entries[0][0] if first is None else first
+            last = entries[-1][0]
+        return {"parts": parts, "frames": frames, "start": first, "end": last}
+
+
+def _jpeg_size(jpeg):
+    """(width, height) from a JPEG's start-of-frame marker."""
+    i = 2
+    while i + 9 <= len(jpeg):
+        if jpeg[i] != 0xFF or jpeg[i + 1] == 0xFF:
+            i += 1
+            continue
+        marker = jpeg[i + 1]
+        if 0xD0 <= marker <= 0xD8 or marker == 0x01:
+            i += 2
+            continue
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", jpeg[i + 5:i + 9])
+            return width, height
+        i += 2 + struct.unpack(">H", jpeg[i + 2:i + 4])[0]
+    return 0, 0
+
+
+def _chunk(fourcc, data):
+    return fourcc + struct.pack("<I", len(data)) + data + b"\0" * (len(data) & 1)
+
+
+def _list(kind, data):
+    return b"LIST" + struct.pack("<I", len(data) + 4) + kind + data
+
+
+def avi_clip(clip):
+    """Wraps a find_clip() result in an MJPEG AVI without re-encoding: each
+    stored JPEG becomes one video chunk. Headers and the idx1 index are built
+    from the frame lengths up front, so the size is known before streaming.
+    Returns (size, chunks)."""
+    lengths = [length for _, frames in clip["parts"] for _, length in frames]
+    first_path, first_frames = clip["parts"][0]
+    with open(first_path, "rb") as f:
+        f.seek(first_frames[0][0])
+        width, height = _jpeg_size(f.read(first_frames[0][1]))
+    count = len(lengths)
+    span = clip["end"] - clip["start"]
+    # AVI has one frame rate; use the average over the clip.
+    fps = (count - 1) / span if count > 1 and span > 0 else 10.0
+    largest = max(lengths)
+
+    index, offset = bytearray(), 4
+    for length in lengths:
+        index += struct.pack("<4sIII", b"00dc", 0x10, offset, length)
+        offset += 8 + length + (length & 1)
+    movi_size = offset
+    avih = struct.pack("<10I16x", round(1e6 / fps), round(largest * fps), 0, 0x10, count, 0, 1, largest, width, height)
+    strh = struct.pack("<4s4sIHH8I4h", b"vids", b"MJPG", 0, 0, 0, 0, 1000, round(fps * 1000), 0, count, largest,
+                       0xFFFFFFFF, 0, 0, 0, width, height)
+    strf = struct.pack("<IiiHH4sIiiII", 40, width, height, 1, 24, b"MJPG", width * height * 3, 0, 0, 0, 0)
+    hdrl = _list(b"hdrl", _chunk(b"avih", avih) + _list(b"strl", _chunk(b"strh", strh) + _chunk(b"strf", strf)))
+    idx1 = _chunk(b"idx1", bytes(index))
+    riff_size = 4 + len(hdrl) + 8 + movi_size + len(idx1)
+    head = b"RIFF" + struct.pack("<I", riff_size) + b"AVI " + hdrl + b"LIST" + struct.pack("<I", movi_size) + b"movi"
+
+    def chunks():
+        yield head
+        for path, frames in clip["parts"]:
+            try:
+                with open(path, "rb") as f:
+                    for offset, length in frames:
+                        f.seek(offset)
+                        yield _chunk(b"00dc", f.read(length))
+            except FileNotFoundError:
+                # Retention removed it after the clip was planned.
+                logger.warning(f"DVR segment gone while streaming: {path}")
+                return
+        yield idx1
+
+    return 8 + riff_size, chunks()
+
+
+class _Segment:
+    """One open segment: the .mjpeg data file and its .idx frame index."""
+
+    def __init__(self, index, camera, start):
+        self.index = index
+        os.makedirs(os.path.dirname(index.segment_path(camera, start)), exist_ok=True)
+        # Every segment gets a file of its own; two rows sharing one would let
+        # retention delete footage the other still indexes.
+        attempt = 0
+        while True:
+            self.path = index.segment_path(camera, start, attempt)
+            try:
+                self.data = open(self.path, "xb")
+                break
+            except FileExistsError:
+                attempt += 1
+        self.entries = open(index_path(self.path), "wb")
+        self.size = 0
+        self.start = start
+        self.last = start
+        self.frames = 0
+        self.id = index.open(camera, self.path, start)
+
+    def write(self, stamp, jpeg):
+        self.entries.write(INDEX_ENTRY.pack(stamp, self.size, len(jpeg)))
+        self.data.write(jpeg)
+        self.size += len(jpeg)
+        self.frames += 1
+        self.last = stamp
+
+    def flush(self):
+        # Data first, so every flushed index entry points at bytes on disk.
+        self.data.flush()
+        self.entries.flush()
+
+    def close(self):
+        self.flush()
+        self.data.close()
+        self.entries.close()
+        self.index.close(self.id, self.last, self.frames, self.size)
+
+
+class SegmentRecorder:
+    """Records one camera's stream into rolling MJPEG segments.
+
+    The frames are the broadcaster's already-encoded JPEGs, so recording costs
+    only sequential writes, and any time range can be served by cutting the
+    segments at frame boundaries without re-encoding.
+    """
+
+    def __init__(self, index, camera, segment_seconds=60, fps=10, max_queue=100, flush_interval=1.0):
+        self.index = index
+        self.camera = camera
+        self.segment_seconds = segment_seconds
+        self.min_gap = 1.0 / fps
+        self.flush_interval = flush_interval
+        self.frames_written = 0
+        self.segments_written = 0
+        self.dropped_frames = 0
+        self._last_stamp = 0.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        # Called as observe(stage, seconds) for each frame written.
+        self.observe = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def add(self, seq, jpeg, stamp):
+        # Signature matches MjpegBroadcaster sinks; called from its thread only.
+        if stamp <= self._last_stamp or stamp - self._last_stamp < self.min_gap * 0.9:
+            return
+        self._last_stamp = stamp
+        try:
+            self._queue.put_nowait((stamp, jpeg))
+        except queue.Full:
+            self.dropped_frames += 1
+
+    def stats(self):
+        stats = self.index.coverage(self.camera)
+        stats.update({
+            "queue_depth": self.queue_depth,
+            "frames_written": self.frames_written,
+            "segments_written": self.segments_written,
+            "dropped_frames": self.dropped_frames,
+        })
+        return stats
+
+    def _finish(self, segment):
+        try:
+            segment.close()
+            self.segments_written += 1
+        except Exception as e:
+            logger.error(f"DVR segment close error for {self.camera}: {e}")
+
+    def _run(self):
+        segment, flushed = None, time.time()
+        while True:
+            try:
+                stamp, jpeg = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                stamp = jpeg = None
+            try:
+                # Roll on time even while no frames arrive, so a stalled camera
+                # doesn't leave a segment open (and unprunable) indefinitely.
+                now = stamp or time.time()
+                if segment is not None and now - segment.start >= self.segment_seconds:
+                    self._finish(segment)
+                    segment = None
+                if jpeg is not None:
+                    started = time.time()
+                    if segment is None:
+                        segment = _Segment(self.index, self.camera, stamp)
+                    segment.write(stamp, jpeg)
+                    self.frames_written += 1
+                    if self.observe:
+                        self.observe("dvr_write", time.time() - started)
+                if segment is not None and time.time() - flushed >= self.flush_interval:
+                    segment.flush()
+                    flushed = time.time()
+            except Exception as e:
+                logger.error(f"DVR write error for {self.camera}: {e}")
+                if segment is not None:
+                    self._finish(segment)
+                segment = None
+                time.sleep(1)
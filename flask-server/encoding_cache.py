@@ -0,0 +1,112 @@
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def encode_image(path):
+    # Runs in a recognition worker, so the heavy imports happen there.
+    import cv2
+    import face_recognition
+    image = cv2.imread(path)
+    if image is None:
+        return []
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    boxes = face_recognition.face_locations(rgb, model="hog")
+    return [enc.tolist() for enc in face_recognition.face_encodings(rgb, boxes)]
+
+
+class EncodingCache:
+    """Per-image face encodings keyed by path and validated by size, mtime and hash."""
+
+    def __init__(self, path="encoding_cache.json", mapper=None):
+        self.path = path
+        # Called as mapper(fn, items) and yields results in order; the
+        # recognition pool's map, so retrains reuse its loaded workers.
+        # Without one, images are encoded in this process.
+        self.mapper = mapper
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self.entries = data["entries"]
+        except Exception as e:
+            logger.error(f"Encoding cache load error: {e}")
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": CACHE_VERSION, "entries": self.entries}, f)
+        os.replace(tmp, self.path)
+
+    def refresh(self, image_paths, progress=None):
+        entries = {}
+        pending = {}
+        current = set(image_paths)
+        by_digest = {e["sha1"]: e for p, e in self.entries.items() if p not in current}
+        for path in image_paths:
+            st = os.stat(path)
+            name = path.split(os.path.sep)[-2]
+            entry = self.entries.get(path)
+            if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                entries[path] = dict(entry, name=name)
+                continue
+            digest = file_digest(path)
+            # Touched or renamed files with identical content keep their encodings.
+            known = entry if entry and entry["sha1"] == digest else by_digest.get(digest)
+            if known:
+                entries[path] = dict(known, name=name, size=st.st_size, mtime_ns=st.st_mtime_ns)
+            else:
+                pending[path] = {"name": name, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": digest}
+
+        if pending:
+            logger.info(f"Encoding {len(pending)} new or changed images")
+            done = 0
+            mapper = self.mapper or map
+            for path, encodings in zip(pending, mapper(encode_image, list(pending))):
+                entries[path] = dict(pending[path], encodings=encodings)
+                done += 1
+                if progress:
+                    progress(done, len(pending))
+
+        stats = {
+            "reused": len(entries) - len(pending),
+            "encoded": len(pending),
+            "removed": len(set(self.entries) - set(entries)),
+        }
+        self.entries = entries
+        self.save()
+        return stats
+
+    def status(self, path):
+        """("encoded" | "no_face" | "pending", face count) for a dataset image."""
+        entry = self.entries.get(path)
+        if entry is None:
+            return "pending", 0
+        return ("encoded" if entry["encodings"] else "no_face"), len(entry["encodings"])
+
+    def encodings_and_names(self):
+        encodings, names = [], []
+        for entry in self.entries.values():
+            for enc in entry["encodings"]:
+                encodings.append(enc)
+                names.append(entry["name"])
+        return encodings, names
@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STORE_VERSION = 1
+
+
+class EncodingStore:
+    """Known face encodings as a float32 .npy matrix plus a JSON names sidecar.
+
+    The sidecar records which matrix file its names belong to and is replaced
+    last, so a save is atomic and a load never pairs names with the wrong rows.
+    """
+
+    def __init__(self, path="encodings.json", legacy_pickle="encodings.pickle"):
+        self.path = path
+        self.legacy_pickle = legacy_pickle
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.stem = os.path.splitext(os.path.basename(path))[0]
+
+    def load(self):
+        """Returns (matrix, names); the matrix is memory-mapped, not read into memory."""
+        if not os.path.exists(self.path):
+            if self.legacy_pickle and os.path.exists(self.legacy_pickle):
+                self._migrate()
+            else:
+                return np.empty((0, 128), dtype=np.float32), []
+        with open(self.path, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported encoding store version {manifest.get('version')}")
+        matrix = np.load(os.path.join(self.directory, manifest["matrix"]), mmap_mode="r")
+        names = manifest["names"]
+        if matrix.dtype != np.float32 or matrix.ndim != 2 or len(matrix) != len(names):
+            raise ValueError(f"{manifest['matrix']} does not match {self.path}")
+        return matrix, names
+
+    def save(self, encodings, names):
+        if len(encodings) != len(names):
+            raise ValueError("Every encoding needs a name")
+        matrix = np.asarray(encodings, dtype=np.float32).reshape(len(encodings), -1) if len(encodings) \
+            else np.empty((0, 128), dtype=np.float32)
+        previous = self._manifest_matrix()
+        generation = self._generation(previous) + 1
+        matrix_name = f"{self.stem}.{generation}.npy"
+        matrix_path = os.path.join(self.directory, matrix_name)
+        with open(matrix_path + ".tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix))
+        os.replace(matrix_path + ".tmp", matrix_path)
+        manifest = {"version": STORE_VERSION, "matrix": matrix_name, "count": len(names), "names": list(names)}
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(self.path + ".tmp", self.path)
+        # Readers that mapped the old matrix keep their view after the unlink.
+        if previous and previous != matrix_name:
+            try:
+                os.remove(os.path.join(self.directory, previous))
+            except FileNotFoundError:
+                pass
+
+    def _manifest_matrix(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f).get("matrix")
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _generation(self, matrix_name):
+        try:
+            return int(matrix_name.rsplit(".", 2)[1])
+        except (AttributeError, IndexError, ValueError):
+            return 0
+
+    def _migrate(self):
+        # One last read of the old pickle; once the sidecar exists only the
+        # store is loaded. The pickle stays where it is (it is checked in).
+        import pickle
+        with open(self.legacy_pickle, "rb") as f:
+            data = pickle.load(f)
+        self.save(data["encodings"], data["names"])
+        logger.info(f"Migrated {len(data['names'])} encodings from {self.legacy_pickle} to {self.path}")
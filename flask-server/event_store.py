@@ -0,0 +1,219 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    type TEXT NOT NULL,
+    name TEXT,
+    image TEXT,
+    video TEXT,
+    camera TEXT,
+    data TEXT NOT NULL DEFAULT '{}'
+);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events(timestamp);
+CREATE INDEX IF NOT EXISTS idx_events_type ON events(type, id);
+CREATE INDEX IF NOT EXISTS idx_events_name ON events(name, id);
+CREATE INDEX IF NOT EXISTS idx_events_camera ON events(camera, id);
+"""
+
+COLUMNS = ("timestamp", "type", "name", "image", "video", "camera")
+# URLs per expire query; each is bound twice, under SQLite's 999 variable limit.
+EXPIRE_BATCH = 400
+
+
+class EventRef:
+    """Handle for an event whose row id is assigned when the batch is written."""
+
+    def __init__(self):
+        self.id = None
+
+
+class EventStore:
+    """Detection history in SQLite (WAL), written in batches by one thread."""
+
+    def __init__(self, path="events.db", flush_interval=0.2, batch_size=100, default_camera=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._thread = None
+        # Called as listener(op, entry) after each batch is committed.
+        self.listeners = []
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._migrate(conn, default_camera)
+            conn.executescript(INDEXES)
+
+    def _migrate(self, conn, default_camera):
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(events)")}
+        if "camera" not in columns:
+            # Databases from before multi-camera support: everything recorded
+            # so far came from the one camera, now the default.
+            conn.execute("ALTER TABLE events ADD COLUMN camera TEXT")
+            conn.execute("UPDATE events SET camera = ?", (default_camera,))
+            logger.info("Added camera column to events")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def add(self, entry, event_type):
+        ref = EventRef()
+        self._queue.put(("insert", ref, dict(entry, type=event_type)))
+        return ref
+
+    def update(self, ref, fields):
+        self._queue.put(("update", ref, fields))
+
+    def expire_media(self, urls):
+        """Clears image/video links to media that retention has deleted and
+        marks those events media_expired, so clients stop requesting them."""
+        for i in range(0, len(urls), EXPIRE_BATCH):
+            self._queue.put(("expire", EventRef(), list(urls[i:i + EXPIRE_BATCH])))
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            ops = [self._queue.get()]
+            deadline = time.time() + self.flush_interval
+            while len(ops) < self.batch_size:
+                try:
+                    ops.append(self._queue.get(timeout=max(0.0, deadline - time.time())))
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    for op, ref, payload in ops:
+                        if op == "insert":
+                            self._insert(conn, ref, payload)
+                        elif op == "expire":
+                            self._expire(conn, ref, payload)
+                        else:
+                            self._update(conn, ref, payload)
+            except Exception as e:
+                logger.error(f"Event store write error: {e}")
+                continue
+            if self.listeners:
+                self._notify(ops)
+
+    def _notify(self, ops):
+        for op, ref, _ in ops:
+            # An expire touches many rows; each is reported as an update.
+            ids = ref.ids if op == "expire" else [ref.id]
+            for event_id in ids:
+                entry = self.get(event_id) if event_id is not None else None
+                if entry is None:
+                    continue
+                for listener in self.listeners:
+                    try:
+                        listener("update" if op == "expire" else op, entry)
+                    except Exception as e:
+                        logger.error(f"Event listener error: {e}")
+
+    def _insert(self, conn, ref, entry):
+        row = [entry.get(c) for c in COLUMNS]
+        extra = {k: v for k, v in entry.items() if k not in COLUMNS}
+        cur = conn.execute(
+            f"INSERT INTO events ({', '.join(COLUMNS)}, data) VALUES ({', '.join('?' * (len(COLUMNS) + 1))})",
+            row + [json.dumps(extra)],
+        )
+        ref.id = cur.lastrowid
+
+    def _update(self, conn, ref, fields):
+        if ref.id is None:
+            return
+        row = conn.execute("SELECT data FROM events WHERE id = ?", (ref.id,)).fetchone()
+        if row is None:
+            return
+        extra = json.loads(row["data"])
+        columns = {k: v for k, v in fields.items() if k in COLUMNS}
+        extra.update({k: v for k, v in fields.items() if k not in COLUMNS})
+        assignments = ", ".join(f"{c} = ?" for c in columns)
+        sql = f"UPDATE events SET {assignments + ', ' if assignments else ''}data = ? WHERE id = ?"
+        conn.execute(sql, list(columns.values()) + [json.dumps(extra), ref.id])
+
+    def _expire(self, conn, ref, urls):
+        marks = ", ".join("?" * len(urls))
+        rows = conn.execute(f"SELECT id, image, video FROM events WHERE image IN ({marks}) OR video IN ({marks})",
+                            urls + urls).fetchall()
+        gone = set(urls)
+        ref.ids = []
+        for row in rows:
+            fields = {"media_expired": True}
+            if row["image"] in gone:
+                fields.update(image=None, thumbnail=None)
+            if row["video"] in gone:
+                fields.update(video=None, video_poster=None)
+            target = EventRef()
+            target.id = row["id"]
+            self._update(conn, target, fields)
+            ref.ids.append(row["id"])
+
+    @staticmethod
+    def _entry(row):
+        entry = json.loads(row["data"])
+        entry.update({c: row[c] for c in COLUMNS})
+        entry["id"] = row["id"]
+        return entry
+
+    def get(self, event_id):
+        row = self._reader().execute("SELECT * FROM events WHERE id = ?", (event_id,)).fetchone()
+        return self._entry(row) if row else None
+
+    def query(self, since=None, cursor=None, limit=50, event_type=None, name=None, camera=None):
+        """Newest-first page of events. `since` returns only events newer than
+        that id; `cursor` continues an older page from the previous next_cursor."""
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("id > ?")
+            params.append(since)
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+        if event_type:
+            clauses.append("type = ?")
+            params.append(event_type)
+        if name:
+            clauses.append("name = ?")
+            params.append(name)
+        if camera:
+            clauses.append("camera = ?")
+            params.append(camera)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._reader().execute(
+            f"SELECT * FROM events {where} ORDER BY id DESC LIMIT ?", params + [limit]
+        ).fetchall()
+        events = [self._entry(r) for r in rows]
+        next_cursor = events[-1]["id"] if events and len(events) == limit else None
+        return events, next_cursor
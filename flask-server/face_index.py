@@ -0,0 +1,55 @@
+import numpy as np
+
+UNKNOWN = "Unknown"
+
+
+class FaceIndex:
+    """Known face encodings packed into one float32 matrix for batched matching."""
+
+    def __init__(self, encodings=(), names=(), use_centroids=False):
+        self.names = sorted(set(names))
+        name_to_id = {name: i for i, name in enumerate(self.names)}
+        self.name_ids = np.array([name_to_id[n] for n in names], dtype=np.int32)
+        if len(encodings):
+            self.matrix = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(len(encodings), -1))
+        else:
+            self.matrix = np.empty((0, 128), dtype=np.float32)
+        self.use_centroids = use_centroids
+        self.centroids = self._build_centroids()
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def _build_centroids(self):
+        if not len(self.matrix):
+            return np.empty((0, self.matrix.shape[1]), dtype=np.float32)
+        sums = np.zeros((len(self.names), self.matrix.shape[1]), dtype=np.float32)
+        np.add.at(sums, self.name_ids, self.matrix)
+        counts = np.bincount(self.name_ids, minlength=len(self.names)).astype(np.float32)
+        return sums / counts[:, None]
+
+    def distances(self, encodings):
+        # Euclidean distance from every query to every reference, computed as
+        # |q|^2 + |r|^2 - 2 q.r so the whole batch is a single matrix product.
+        queries = np.asarray(encodings, dtype=np.float32).reshape(len(encodings), -1)
+        refs = self.centroids if self.use_centroids else self.matrix
+        sq = (np.einsum('ij,ij->i', queries, queries)[:, None]
+              + np.einsum('ij,ij->i', refs, refs)[None, :]
+              - 2.0 * queries @ refs.T)
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq, out=sq)
+
+    def match(self, encodings, tolerance=0.5):
+        if not len(encodings):
+            return []
+        if not len(self.matrix):
+            return [(UNKNOWN, None) for _ in encodings]
+        dists = self.distances(encodings)
+        best = dists.argmin(axis=1)
+        results = []
+        for row, col in enumerate(best):
+            distance = float(dists[row, col])
+            name_id = col if self.use_centroids else self.name_ids[col]
+            name = self.names[name_id] if distance <= tolerance else UNKNOWN
+            results.append((name, distance))
+        return results
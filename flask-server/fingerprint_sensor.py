@@ -0,0 +1,244 @@
+import itertools
+import logging
+import queue
+import time
+from concurrent.futures import Future
+from threading import Lock, Thread
+
+logger = logging.getLogger(__name__)
+
+# Status codes returned by the R30x/AS608 protocol (same values as adafruit_fingerprint).
+OK = 0x00
+NOFINGER = 0x02
+IMAGEFAIL = 0x03
+NOTFOUND = 0x09
+
+PRIORITY_VERIFY = 0
+PRIORITY_ADMIN = 10
+
+MAX_SLOTS = 127
+
+# Seconds between attempts to reopen a sensor that failed to open, doubling
+# up to the maximum while it stays unavailable.
+RETRY_MIN = 1.0
+RETRY_MAX = 60.0
+
+
+class FingerprintError(Exception):
+    pass
+
+
+class FakeFingerprint:
+    """Scripted stand-in for Adafruit_Fingerprint, for running without the UART."""
+
+    def __init__(self, templates=None):
+        # templates maps slot -> finger label; place_finger() puts a label on the glass.
+        self.stored = dict(templates or {})
+        self.templates = []
+        self.finger_id = None
+        self.confidence = None
+        self.finger = None
+        self.commands = 0
+        self._buffers = {}
+        self._model = None
+
+    def place_finger(self, label):
+        self.finger = label
+
+    def remove_finger(self):
+        self.finger = None
+
+    def read_templates(self):
+        self.commands += 1
+        self.templates = sorted(self.stored)
+        return OK
+
+    def get_image(self):
+        self.commands += 1
+        return OK if self.finger is not None else NOFINGER
+
+    def image_2_tz(self, slot=1):
+        self.commands += 1
+        if self.finger is None:
+            return IMAGEFAIL
+        self._buffers[slot] = self.finger
+        return OK
+
+    def finger_search(self):
+        self.commands += 1
+        label = self._buffers.get(1)
+        for fid, stored in self.stored.items():
+            if stored == label:
+                self.finger_id, self.confidence = fid, 100
+                return OK
+        return NOTFOUND
+
+    def create_model(self):
+        self.commands += 1
+        if self._buffers.get(1) is None or self._buffers.get(1) != self._buffers.get(2):
+            return IMAGEFAIL
+        self._model = self._buffers[1]
+        return OK
+
+    def store_model(self, location, slot=1):
+        self.commands += 1
+        self.stored[location] = self._model
+        return OK
+
+    def delete_model(self, location):
+        self.commands += 1
+        if location not in self.stored:
+            return IMAGEFAIL
+        del self.stored[location]
+        return OK
+
+
+class FingerprintSensor:
+    """Single owner of the fingerprint UART; runs commands from a priority queue."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.finger = None
+        self.commands_run = 0
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._templates_lock = Lock()
+        self._templates = None
+        self._retry_at = 0.0
+        self._retry_delay = RETRY_MIN
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    @property
+    def available(self):
+        return self.finger is not None
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def submit(self, fn, priority=PRIORITY_ADMIN):
+        future = Future()
+        self._queue.put((priority, next(self._order), fn, future))
+        return future
+
+    def _connect(self):
+        """Opens the sensor if it isn't open and a retry is due; the handle
+        is kept even when the template read fails, as enroll re-reads them."""
+        if self.finger is not None or time.time() < self._retry_at:
+            return self.finger
+        try:
+            finger = self.factory()
+        except Exception as e:
+            if self._retry_delay == RETRY_MIN:
+                logger.error(f"Fingerprint sensor init failed: {e}")
+            self._retry_at = time.time() + self._retry_delay
+            self._retry_delay = min(self._retry_delay * 2, RETRY_MAX)
+            return None
+        self.finger = finger
+        self._retry_delay = RETRY_MIN
+        try:
+            self._refresh_templates(finger)
+        except Exception as e:
+            logger.warning(f"Fingerprint template read failed: {e}")
+        return finger
+
+    def _run(self):
+        self._connect()
+        while True:
+            _, _, fn, future = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            if self._connect() is None:
+                future.set_exception(FingerprintError("Fingerprint sensor not available"))
+                continue
+            try:
+                future.set_result(fn(self.finger))
+            except Exception as e:
+                future.set_exception(e)
+            self.commands_run += 1
+
+    def _refresh_templates(self, finger):
+        if finger.read_templates() != OK:
+            raise FingerprintError("Failed to read templates")
+        with self._templates_lock:
+            self._templates = set(finger.templates or [])
+        return self.templates()
+
+    def templates(self):
+        """Cached occupied slots, or None before the first read."""
+        with self._templates_lock:
+            return None if self._templates is None else sorted(self._templates)
+
+    def refresh_templates(self):
+        return self.submit(self._refresh_templates)
+
+    def verify(self, priority=PRIORITY_VERIFY):
+        """Future of (status, fingerprint_id); status is one of
+        "no_finger", "convert_failed", "not_found" or "ok"."""
+        def command(finger):
+            if finger.get_image() != OK:
+                return "no_finger", None
+            if finger.image_2_tz(1) != OK:
+                return "convert_failed", None
+            if finger.finger_search() != OK:
+                return "not_found", None
+            return "ok", finger.finger_id
+        return self.submit(command, priority)
+
+    def delete(self, fid):
+        def command(finger):
+            if finger.delete_model(fid) != OK:
+                raise FingerprintError("Failed to delete fingerprint")
+            with self._templates_lock:
+                if self._templates is not None:
+                    self._templates.discard(fid)
+        return self.submit(command)
+
+    def enroll(self, timeout=30):
+        """Future of the slot the new template was stored in."""
+        def wait_for(finger, want_finger, deadline):
+            while time.time() < deadline:
+                result = finger.get_image()
+                if want_finger and result == OK:
+                    return
+                if not want_finger and result == NOFINGER:
+                    return
+                if want_finger and result not in (OK, NOFINGER):
+                    raise FingerprintError("Imaging error" if result == IMAGEFAIL else "Unknown image error")
+                time.sleep(0.2)
+            raise FingerprintError("Timed out waiting for finger")
+
+        def command(finger):
+            deadline = time.time() + timeout
+            for img_num in [1, 2]:
+                logger.info("Step %d: Place finger on sensor...", img_num)
+                wait_for(finger, True, deadline)
+                if finger.image_2_tz(img_num) != OK:
+                    raise FingerprintError(f"Templating failed at step {img_num}")
+                if img_num == 1:
+                    logger.info("Remove finger...")
+                    wait_for(finger, False, deadline)
+            if finger.create_model() != OK:
+                raise FingerprintError("Fingerprints did not match")
+            # Without the occupied slots the first free one can't be chosen
+            # safely, so read them now if the read at startup failed.
+            if self.templates() is None:
+                self._refresh_templates(finger)
+            with self._templates_lock:
+                used = set(self._templates)
+            position = next((i for i in range(1, MAX_SLOTS + 1) if i not in used), None)
+            if position is None:
+                raise FingerprintError("No available fingerprint slots")
+            if finger.store_model(position) != OK:
+                raise FingerprintError("Failed to store fingerprint")
+            with self._templates_lock:
+                if self._templates is not None:
+                    self._templates.add(position)
+            return position
+        return self.submit(command)
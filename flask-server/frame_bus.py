@@ -0,0 +1,75 @@
+import time
+from threading import Condition
+
+import numpy as np
+
+
+class FrameBus:
+    """Latest-frame ring shared by one producer and any number of readers."""
+
+    def __init__(self, slots=8):
+        self.slots = slots
+        self._ring = None
+        self._stamps = [0.0] * slots
+        self._seq = 0
+        self._cond = Condition()
+
+    def _allocate(self, frame):
+        shape = frame.shape[:2] + (3,) if frame.ndim == 3 else frame.shape
+        self._ring = np.empty((self.slots,) + shape, dtype=frame.dtype)
+
+    def publish(self, frame):
+        # Capture formats like XBGR8888 carry a padding channel; consumers only
+        # ever used the first three, so drop it while copying into the slot.
+        if frame.ndim == 3 and frame.shape[2] > 3:
+            frame = frame[:, :, :3]
+        if self._ring is None or self._ring.shape[1:] != frame.shape:
+            with self._cond:
+                self._allocate(frame)
+        seq = self._seq + 1
+        slot = seq % self.slots
+        np.copyto(self._ring[slot], frame)
+        self._stamps[slot] = time.time()
+        with self._cond:
+            self._seq = seq
+            self._cond.notify_all()
+        return seq
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def latest(self):
+        # Returns a read-only view into the ring; it stays valid until the
+        # producer wraps around, see is_current().
+        with self._cond:
+            seq = self._seq
+            if seq == 0:
+                return 0, None, None
+            slot = seq % self.slots
+            view = self._ring[slot]
+        view = view.view()
+        view.flags.writeable = False
+        return seq, view, self._stamps[slot]
+
+    def wait(self, after_seq, timeout=1.0):
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after_seq, timeout)
+        return self.latest()
+
+    def is_current(self, seq):
+        # A slot is overwritten once the producer has published slots-1 newer
+        # frames. Readers holding a view check this after using it and drop
+        # the frame if it fails, as the pixels may have been torn.
+        return self._seq - seq < self.slots - 1
+
+    def latest_copy(self):
+        """latest() as a private copy, retaken if the producer reached the
+        slot while it was being copied."""
+        while True:
+            seq, view, stamp = self.latest()
+            if view is None:
+                return seq, None, stamp
+            frame = view.copy()
+            if self.is_current(seq):
+                return seq, frame, stamp
@@ -0,0 +1,169 @@
+import glob
+import logging
+import os
+import time
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png", "*.bmp")
+
+
+class PiCamera:
+    def __init__(self, size=(640, 480), index=0):
+        from picamera2 import Picamera2
+        self.camera = Picamera2(index)
+        config = self.camera.create_preview_configuration(main={"size": size})
+        self.camera.configure(config)
+        self.camera.start()
+
+    def capture_array(self):
+        return self.camera.capture_array()
+
+    def close(self):
+        self.camera.stop()
+
+
+class OpenCVCamera:
+    """A V4L2/USB device or an RTSP stream read through cv2.VideoCapture."""
+
+    def __init__(self, source, size=(640, 480), reconnect_delay=2.0):
+        # A bare number or /dev/videoN is a local device; anything else is a URL.
+        self.source = int(source) if str(source).isdigit() else source
+        self.size = size
+        self.reconnect_delay = reconnect_delay
+        self.is_device = isinstance(self.source, int) or str(self.source).startswith("/dev/")
+        self._capture = None
+        self._open()
+
+    def _open(self):
+        backend = cv2.CAP_V4L2 if self.is_device else cv2.CAP_FFMPEG
+        self._capture = cv2.VideoCapture(self.source, backend)
+        if not self._capture.isOpened():
+            raise ValueError(f"Cannot open {self.source}")
+        if self.is_device and self.size:
+            self._capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.size[0])
+            self._capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.size[1])
+        # Keep only the newest frame queued so reads never return stale video.
+        self._capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    def capture_array(self):
+        ok, frame = self._capture.read()
+        if not ok:
+            # Network streams drop; reopen and let the capture loop retry.
+            self._capture.release()
+            time.sleep(self.reconnect_delay)
+            self._open()
+            raise IOError(f"Lost {self.source}, reconnected")
+        if self.size and (frame.shape[1], frame.shape[0]) != tuple(self.size):
+            frame = cv2.resize(frame, tuple(self.size), interpolation=cv2.INTER_AREA)
+        # Same channel order as Picamera2, see FileCamera.capture_array.
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def close(self):
+        self._capture.release()
+
+
+class FileCamera:
+    """Replays a video file or a directory of images as if it were the camera."""
+
+    def __init__(self, source, fps=None, loop=True, size=(640, 480)):
+        self.source = source
+        self.loop = loop
+        self.size = size
+        self.frames_read = 0
+        self._capture = None
+        self._images = None
+        self._index = 0
+        if os.path.isdir(source):
+            self._images = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(source, pattern)))
+            if not self._images:
+                raise ValueError(f"No images in {source}")
+            self.fps = fps or 10
+        else:
+            self._capture = cv2.VideoCapture(source)
+            if not self._capture.isOpened():
+                raise ValueError(f"Cannot open {source}")
+            self.fps = fps or self._capture.get(cv2.CAP_PROP_FPS) or 30
+        self._interval = 1.0 / self.fps
+        self._next = time.time()
+
+    def _read(self):
+        if self._images is not None:
+            if self._index >= len(self._images):
+                if not self.loop:
+                    return None
+                self._index = 0
+            frame = cv2.imread(self._images[self._index])
+            self._index += 1
+            return frame
+        ok, frame = self._capture.read()
+        if not ok and self.loop:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._capture.read()
+        return frame if ok else None
+
+    def capture_array(self):
+        # Pace to the source frame rate, like a real sensor blocking on exposure.
+        delay = self._next - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        self._next = max(self._next + self._interval, time.time())
+        frame = self._read()
+        if frame is None:
+            raise EOFError(f"End of {self.source}")
+        if self.size and (frame.shape[1], frame.shape[0]) != tuple(self.size):
+            frame = cv2.resize(frame, tuple(self.size), interpolation=cv2.INTER_AREA)
+        self.frames_read += 1
+        # Picamera2's default XBGR8888 arrays are RGB ordered; match that so
+        # the rest of the pipeline sees the same channel layout as on the Pi.
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def close(self):
+        if self._capture is not None:
+            self._capture.release()
+
+
+class MemoryGpio:
+    """Drop-in for the RPi.GPIO calls the server makes, recording pin changes."""
+
+    BCM = "BCM"
+    OUT = "OUT"
+    IN = "IN"
+
+    def __init__(self):
+        self.modes = {}
+        self.levels = {}
+        self.history = []
+
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, pin, mode):
+        self.modes[pin] = mode
+
+    def output(self, pin, value):
+        self.levels[pin] = value
+        self.history.append((time.time(), pin, value))
+
+    def input(self, pin):
+        return self.levels.get(pin, 1)
+
+
+def open_camera(backend, source=None, size=(640, 480)):
+    if backend == "file":
+        return FileCamera(source, size=size)
+    if backend in ("v4l2", "rtsp"):
+        return OpenCVCamera(source if source is not None else 0, size=size)
+    return PiCamera(size=size, index=int(source or 0))
+
+
+def open_gpio(backend):
+    if backend == "memory":
+        return MemoryGpio()
+    import RPi.GPIO as GPIO
+    return GPIO
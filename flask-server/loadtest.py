@@ -0,0 +1,151 @@
+"""Load test against a running server: how many /video_feed viewers and API
+requests per second it sustains. Standard library only.
+
+    python loadtest.py --url http://pi.local:5000 --viewers 1,5,10,20,40 --api-clients 8
+
+Each step holds the given number of MJPEG viewers open while --api-clients
+loop over the API paths, then reports per-viewer frame rates and request
+throughput/latency. Run it against `python server.py` and against
+`uvicorn asgi:app` to compare the two serving modes.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+BOUNDARY = b"--frame"
+DEFAULT_API_PATHS = ("/auth_status", "/motion_status", "/detect?limit=20", "/")
+
+
+async def open_get(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    return reader, writer, status
+
+
+async def viewer(host, port, path, counts, index, stop):
+    try:
+        reader, writer, status = await open_get(host, port, path)
+    except OSError:
+        return
+    if status != 200:
+        writer.close()
+        return
+    tail = b""
+    try:
+        while not stop.is_set():
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            data = tail + chunk
+            counts[index] += data.count(BOUNDARY)
+            # Keep enough to catch a boundary split across two reads.
+            tail = data[-(len(BOUNDARY) - 1):]
+    finally:
+        writer.close()
+
+
+async def api_client(host, port, paths, latencies, errors, stop):
+    i = 0
+    while not stop.is_set():
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            reader, writer, status = await open_get(host, port, path)
+            await reader.read()
+            writer.close()
+            if status >= 500:
+                errors.append(status)
+            else:
+                latencies.append(time.perf_counter() - started)
+        except OSError:
+            errors.append(0)
+            await asyncio.sleep(0.1)
+
+
+async def run_step(host, port, stream_path, api_paths, viewers, api_clients, duration, warmup):
+    counts = [0] * viewers
+    latencies, errors = [], []
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(viewer(host, port, stream_path, counts, i, stop)) for i in range(viewers)]
+    tasks += [asyncio.create_task(api_client(host, port, api_paths, latencies, errors, stop))
+              for _ in range(api_clients)]
+    await asyncio.sleep(warmup)
+    counts[:] = [0] * viewers
+    del latencies[:], errors[:]
+    await asyncio.sleep(duration)
+    fps = [c / duration for c in counts]
+    measured = sorted(latencies)
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "viewers": viewers,
+        "connected_viewers": sum(1 for c in counts if c),
+        "viewer_fps_min": round(min(fps), 1) if fps else None,
+        "viewer_fps_median": round(statistics.median(fps), 1) if fps else None,
+        "api_rps": round(len(measured) / duration, 1),
+        "api_p50_ms": round(measured[len(measured) // 2] * 1000, 1) if measured else None,
+        "api_p95_ms": round(measured[min(len(measured) - 1, int(len(measured) * 0.95))] * 1000, 1) if measured else None,
+        "api_errors": len(errors),
+    }
+
+
+def sustained(step, target_fps, max_p95_ms):
+    return (step["connected_viewers"] == step["viewers"]
+            and (not step["viewers"] or step["viewer_fps_min"] >= target_fps)
+            and step["api_p95_ms"] is not None and step["api_p95_ms"] <= max_p95_ms
+            and not step["api_errors"])
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--camera", help="stream /video_feed/<camera> instead of the default")
+    parser.add_argument("--tier", help="stream tier to request: high, medium, low or auto")
+    parser.add_argument("--viewers", default="1,5,10,20,40", help="comma-separated viewer counts, one step each")
+    parser.add_argument("--api-clients", type=int, default=8)
+    parser.add_argument("--api-paths", default=",".join(DEFAULT_API_PATHS))
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--target-fps", type=float, default=15.0, help="minimum per-viewer fps to count as sustained")
+    parser.add_argument("--max-p95-ms", type=float, default=500.0)
+    parser.add_argument("--json", help="also write the report here")
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    stream_path = f"/video_feed/{args.camera}" if args.camera else "/video_feed"
+    if args.tier:
+        stream_path += f"?tier={args.tier}"
+    api_paths = [p for p in args.api_paths.split(",") if p]
+    steps = []
+    for viewers in (int(v) for v in args.viewers.split(",")):
+        step = await run_step(host, port, stream_path, api_paths, viewers, args.api_clients,
+                              args.duration, args.warmup)
+        step["sustained"] = sustained(step, args.target_fps, args.max_p95_ms)
+        steps.append(step)
+        print(json.dumps(step))
+    ok = [s for s in steps if s["sustained"]]
+    report = {
+        "url": args.url,
+        "steps": steps,
+        "max_sustained_viewers": max((s["viewers"] for s in ok), default=0),
+        "api_rps_at_max": max(ok, key=lambda s: s["viewers"])["api_rps"] if ok else None,
+    }
+    print(json.dumps({k: v for k, v in report.items() if k != "steps"}, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+import logging
+import mimetypes
+import os
+
+import cv2
+from flask import abort, send_from_directory
+from werkzeug.security import safe_join
+
+logger = logging.getLogger(__name__)
+
+mimetypes.add_type("video/mp4", ".mp4")
+mimetypes.add_type("video/x-msvideo", ".avi")
+
+THUMB_WIDTH = 240
+THUMB_QUALITY = 70
+
+
+def send_media(directory, filename, max_age=0):
+    # Snapshots and thumbnails are rewritten when a visit finds a better frame,
+    # so clients revalidate each time; send_from_directory handles Range, ETag
+    # and If-Modified-Since, which makes an unchanged file a cheap 304.
+    mimetype, _ = mimetypes.guess_type(filename)
+    return send_from_directory(directory, filename, mimetype=mimetype,
+                               conditional=True, etag=True, max_age=max_age)
+
+
+class Thumbnails:
+    """Small JPEG previews for snapshots, dataset images and clip posters."""
+
+    def __init__(self, root="static/thumbs", sources=None, width=THUMB_WIDTH):
+        self.root = root
+        self.width = width
+        # kind -> directory holding the originals
+        self.sources = sources or {}
+        for kind in self.sources:
+            os.makedirs(os.path.join(root, kind), exist_ok=True)
+
+    @staticmethod
+    def name_for(filename):
+        return os.path.splitext(filename)[0] + ".jpg"
+
+    def path_for(self, kind, filename):
+        return os.path.join(self.root, kind, self.name_for(filename))
+
+    def url_for(self, kind, filename):
+        return f"/thumbs/{kind}/{self.name_for(filename)}"
+
+    def write(self, kind, filename, frame):
+        """Writes the thumbnail from an in-memory frame and returns its URL."""
+        try:
+            height, width = frame.shape[:2]
+            scale = min(1.0, self.width / float(width))
+            small = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+            path = self.path_for(kind, filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            cv2.imwrite(path, small, [int(cv2.IMWRITE_JPEG_QUALITY), THUMB_QUALITY])
+            return self.url_for(kind, filename)
+        except Exception as e:
+            logger.error(f"Thumbnail error for {kind}/{filename}: {e}")
+            return None
+
+    def _load_source(self, kind, filename):
+        path = os.path.join(self.sources[kind], filename)
+        if not os.path.exists(path):
+            return None
+        mimetype, _ = mimetypes.guess_type(path)
+        if mimetype and mimetype.startswith("video/"):
+            capture = cv2.VideoCapture(path)
+            try:
+                count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+                if count > 1:
+                    capture.set(cv2.CAP_PROP_POS_FRAMES, count // 2)
+                ok, frame = capture.read()
+            finally:
+                capture.release()
+            return frame if ok else None
+        return cv2.imread(path)
+
+    def find_source(self, kind, thumb_name):
+        stem = os.path.splitext(thumb_name)[0]
+        directory = self.sources.get(kind)
+        if directory is None:
+            return None
+        folder = os.path.join(directory, os.path.dirname(stem))
+        if not os.path.isdir(folder):
+            return None
+        for candidate in os.listdir(folder):
+            if os.path.splitext(candidate)[0] == os.path.basename(stem):
+                return os.path.join(os.path.dirname(stem), candidate)
+        return None
+
+    def send(self, kind, thumb_name):
+        """Serves a thumbnail, creating it from the original for media written
+        before thumbnails existed."""
+        if kind not in self.sources:
+            abort(404)
+        path = safe_join(self.root, kind, thumb_name)
+        if path is None:
+            abort(404)
+        if not os.path.exists(path):
+            source = self.find_source(kind, thumb_name)
+            frame = self._load_source(kind, source) if source else None
+            if frame is None:
+                abort(404)
+            self.write(kind, source, frame)
+        return send_media(os.path.join(self.root, kind), thumb_name)
@@ -0,0 +1,117 @@
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+# Seconds; spans a JPEG encode (~ms) up to a slow push or a stuck UART read.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if value is not None else "NaN"
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by one label, Prometheus style."""
+
+    def __init__(self, name, help, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = Lock()
+
+    def observe(self, key, value):
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, key):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(key, time.perf_counter() - started)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                base = [(self.label, key)]
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f"{self.name}_bucket{_labels(base + [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_labels(base + [('le', '+Inf')])} {series['count']}")
+                lines.append(f"{self.name}_sum{_labels(base)} {_number(series['sum'])}")
+                lines.append(f"{self.name}_count{_labels(base)} {series['count']}")
+        return lines
+
+
+class Registry:
+    """Stage timings, sampled gauges/counters and loop heartbeats for /metrics."""
+
+    def __init__(self, prefix="securityapp"):
+        self.prefix = prefix
+        self.stages = Histogram(f"{prefix}_stage_seconds", "Time spent in each pipeline stage.", "stage")
+        self._samplers = []
+        self._threads = {}
+        self._beats = {}
+
+    def observe(self, stage, seconds):
+        self.stages.observe(stage, seconds)
+
+    def time(self, stage):
+        return self.stages.time(stage)
+
+    def gauge(self, name, help, fn, label=None, kind="gauge"):
+        # fn returns a number, or a {label value: number} dict when label is set;
+        # with a tuple of labels the dict is keyed by tuples of values.
+        self._samplers.append((f"{self.prefix}_{name}", help, fn, label, kind))
+
+    def counter(self, name, help, fn, label=None):
+        self.gauge(name, help, fn, label, kind="counter")
+
+    def watch(self, name, thread):
+        self._threads[name] = thread
+
+    def heartbeat(self, name):
+        self._beats[name] = time.time()
+
+    def render(self):
+        lines = self.stages.render()
+        for name, help, fn, label, kind in self._samplers:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            try:
+                value = fn()
+            except Exception:
+                value = None
+            if label:
+                names = label if isinstance(label, tuple) else (label,)
+                for key, v in sorted((value or {}).items()):
+                    values = key if isinstance(label, tuple) else (key,)
+                    lines.append(f"{name}{_labels(list(zip(names, values)))} {_number(v)}")
+            else:
+                lines.append(f"{name} {_number(value)}")
+
+        now = time.time()
+        alive = f"{self.prefix}_thread_alive"
+        lines += [f"# HELP {alive} Whether a background thread is running.", f"# TYPE {alive} gauge"]
+        for name, thread in sorted(self._threads.items()):
+            lines.append(f"{alive}{_labels([('thread', name)])} {int(thread.is_alive())}")
+        age = f"{self.prefix}_thread_heartbeat_age_seconds"
+        lines += [f"# HELP {age} Seconds since a loop last reported progress.", f"# TYPE {age} gauge"]
+        for name, beat in sorted(self._beats.items()):
+            lines.append(f"{age}{_labels([('thread', name)])} {_number(round(now - beat, 3))}")
+        return "\n".join(lines) + "\n"
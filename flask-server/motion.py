@@ -0,0 +1,94 @@
+import numpy as np
+import cv2
+
+# A change covering most of the frame at once is a light switching or the
+# camera re-exposing, not something walking past.
+LIGHTING_CHANGE_RATIO = 0.6
+
+
+class MotionDetector:
+    """Running-average background subtraction on a small grayscale frame.
+
+    All working buffers are allocated once for the frame size and reused, so a
+    detection pass performs no per-frame allocations apart from contours.
+    """
+
+    def __init__(self, width=160, sensitivity=0.5, learning_rate=0.05, zones=None):
+        self.width = width
+        self.learning_rate = learning_rate
+        self.zones = zones or []
+        self.set_sensitivity(sensitivity)
+        self._shape = None
+
+    def set_sensitivity(self, sensitivity):
+        # 0.5 matches the original full-frame settings: a pixel delta of 30 over
+        # 800 of 640x480 pixels (~0.26% of the frame).
+        self.sensitivity = min(max(float(sensitivity), 0.0), 1.0)
+        self.threshold = int(55 - 50 * self.sensitivity)
+        self.min_ratio = 0.0026 * 2 ** ((0.5 - self.sensitivity) * 4)
+
+    def set_zones(self, zones):
+        # Zones are polygons in normalised [0, 1] coordinates that are ignored.
+        self.zones = zones or []
+        if self._shape is not None:
+            self._build_mask()
+
+    def _allocate(self, frame_shape):
+        height, width = frame_shape[:2]
+        self.scale = width / float(self.width)
+        small_h = max(1, int(round(height / self.scale)))
+        self._shape = frame_shape
+        self._size = (self.width, small_h)
+        self._small = np.empty((small_h, self.width, 3), dtype=np.uint8)
+        self._gray = np.empty((small_h, self.width), dtype=np.uint8)
+        self._background = None
+        self._background_u8 = np.empty_like(self._gray)
+        self._diff = np.empty_like(self._gray)
+        self._dilated = np.empty_like(self._gray)
+        self._build_mask()
+
+    def _build_mask(self):
+        small_h = self._size[1]
+        self._mask = np.full((small_h, self.width), 255, dtype=np.uint8)
+        for zone in self.zones:
+            points = np.array([[x * self.width, y * small_h] for x, y in zone], dtype=np.int32)
+            cv2.fillPoly(self._mask, [points], 0)
+        self._active_pixels = max(1, cv2.countNonZero(self._mask))
+
+    def reset(self):
+        self._background = None
+
+    def process(self, frame):
+        """Returns (motion, boxes, score); boxes are (x, y, w, h) in frame pixels."""
+        if self._shape != frame.shape:
+            self._allocate(frame.shape)
+        cv2.resize(frame, self._size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        cv2.GaussianBlur(self._gray, (5, 5), 0, dst=self._gray)
+        if self._background is None:
+            self._background = self._gray.astype(np.float32)
+            return False, [], 0.0
+
+        cv2.convertScaleAbs(self._background, dst=self._background_u8)
+        cv2.absdiff(self._gray, self._background_u8, dst=self._diff)
+        cv2.threshold(self._diff, self.threshold, 255, cv2.THRESH_BINARY, dst=self._diff)
+        cv2.bitwise_and(self._diff, self._mask, dst=self._diff)
+        score = cv2.countNonZero(self._diff) / float(self._active_pixels)
+
+        if score > LIGHTING_CHANGE_RATIO:
+            self._background[...] = self._gray
+            return False, [], score
+        cv2.accumulateWeighted(self._gray, self._background, self.learning_rate)
+        if score < self.min_ratio:
+            return False, [], score
+
+        cv2.dilate(self._diff, None, dst=self._dilated, iterations=2)
+        contours, _ = cv2.findContours(self._dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        min_area = self.min_ratio * self._active_pixels / 4
+        boxes = []
+        for contour in contours:
+            if cv2.contourArea(contour) < min_area:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            boxes.append((int(x * self.scale), int(y * self.scale), int(w * self.scale), int(h * self.scale)))
+        return bool(boxes), boxes, score
@@ -0,0 +1,39 @@
+from collections import deque
+from threading import Lock
+
+
+class PrerollBuffer:
+    """The last few seconds of JPEG-encoded frames, ordered by capture time."""
+
+    def __init__(self, seconds=5.0, fps=10):
+        self.seconds = seconds
+        self.min_gap = 1.0 / fps
+        self._frames = deque()
+        self._bytes = 0
+        self._lock = Lock()
+        # Called as on_frame(jpeg, stamp) for every frame kept.
+        self.on_frame = None
+
+    def add(self, seq, jpeg, stamp):
+        # Signature matches MjpegBroadcaster sinks, so the encoded stream bytes
+        # are reused instead of compressing the frame a second time.
+        with self._lock:
+            if self._frames:
+                if stamp <= self._frames[-1][0] or stamp - self._frames[-1][0] < self.min_gap * 0.9:
+                    return
+            self._frames.append((stamp, jpeg))
+            self._bytes += len(jpeg)
+            while stamp - self._frames[0][0] > self.seconds:
+                _, old = self._frames.popleft()
+                self._bytes -= len(old)
+        if self.on_frame:
+            self.on_frame(jpeg, stamp)
+
+    def frames(self):
+        with self._lock:
+            return [jpeg for _, jpeg in self._frames]
+
+    def stats(self):
+        with self._lock:
+            span = self._frames[-1][0] - self._frames[0][0] if self._frames else 0.0
+            return {"frames": len(self._frames), "bytes": self._bytes, "seconds": round(span, 2)}
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import queue
+import time
+from threading import Lock, Thread
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+EXPO_BATCH_LIMIT = 100
+
+
+class PushDispatcher:
+    """Sends Expo push notifications from a background thread.
+
+    Alerts raised within `window` seconds of each other are coalesced into one
+    notification per device and sent with Expo's batch format.
+    """
+
+    def __init__(self, endpoint, tokens_file="push_tokens.json", window=2.0,
+                 max_queue=100, max_retries=3, backoff=1.0, timeout=10):
+        self.endpoint = endpoint
+        self.tokens_file = tokens_file
+        self.window = window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        # Called as observe(stage, seconds) for each batch sent.
+        self.observe = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._tokens_lock = Lock()
+        self._tokens = set()
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self._thread = None
+        self._load_tokens()
+
+    def _load_tokens(self):
+        if os.path.exists(self.tokens_file):
+            try:
+                with open(self.tokens_file, "r") as f:
+                    self._tokens = set(json.load(f))
+            except Exception as e:
+                logger.error(f"Push token load error: {e}")
+
+    def _save_tokens(self):
+        with open(self.tokens_file, "w") as f:
+            json.dump(sorted(self._tokens), f)
+
+    @property
+    def tokens(self):
+        with self._tokens_lock:
+            return sorted(self._tokens)
+
+    def add_token(self, token):
+        with self._tokens_lock:
+            if token not in self._tokens:
+                self._tokens.add(token)
+                self._save_tokens()
+
+    def remove_token(self, token):
+        with self._tokens_lock:
+            if token in self._tokens:
+                self._tokens.discard(token)
+                self._save_tokens()
+                return True
+        return False
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def notify(self, alert):
+        try:
+            self._queue.put_nowait(alert)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Push queue full, dropping alert")
+            return False
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            alerts = [self._queue.get()]
+            deadline = time.time() + self.window
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    alerts.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            tokens = self.tokens
+            if not tokens:
+                continue
+            try:
+                self._send(self._messages(alerts, tokens))
+            except Exception as e:
+                logger.error(f"Push error: {e}")
+
+    def _messages(self, alerts, tokens):
+        if len(alerts) == 1:
+            alert = alerts[0]
+            title = f'{alert["name"]} Detected!'
+            body = f"At {alert['timestamp']}"
+            data = alert
+        else:
+            names = sorted({a["name"] for a in alerts})
+            title = f"{len(alerts)} alerts"
+            body = f"{', '.join(names)} between {alerts[0]['timestamp']} and {alerts[-1]['timestamp']}"
+            data = {"alerts": alerts}
+        return [{"to": token, "sound": "default", "title": title, "body": body, "data": data} for token in tokens]
+
+    def _send(self, messages):
+        for i in range(0, len(messages), EXPO_BATCH_LIMIT):
+            batch = messages[i:i + EXPO_BATCH_LIMIT]
+            started = time.time()
+            response = self._post(batch)
+            if self.observe:
+                self.observe("push_send", time.time() - started)
+            if response is None:
+                self.failed += len(batch)
+                continue
+            self.sent += len(batch)
+            logger.info(f"Push notification sent to {len(batch)} device(s)")
+            self._prune(batch, response)
+
+    def _post(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._session.post(self.endpoint, json=batch, timeout=self.timeout)
+                if response.status_code < 500 and response.status_code != 429:
+                    response.raise_for_status()
+                    return response
+                logger.warning(f"Push endpoint returned {response.status_code}")
+            except requests.HTTPError as e:
+                logger.error(f"Push rejected: {e}")
+                return None
+            except requests.RequestException as e:
+                logger.warning(f"Push attempt {attempt + 1} failed: {e}")
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        return None
+
+    def _prune(self, batch, response):
+        # Expo answers with one ticket per message; drop devices it no longer knows.
+        try:
+            tickets = response.json().get("data", [])
+        except ValueError:
+            return
+        for message, ticket in zip(batch, tickets):
+            details = ticket.get("details") or {}
+            if ticket.get("status") == "error" and details.get("error") == "DeviceNotRegistered":
+                logger.info(f"Removing unregistered push token {message['to']}")
+                self.remove_token(message["to"])
@@ -0,0 +1,210 @@
+import logging
+import multiprocessing as mp
+import os
+import time
+from collections import Counter, deque
+from multiprocessing import resource_tracker, shared_memory
+from threading import Condition
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_worker_segments = {}
+
+
+def _init_worker():
+    # Load dlib's models once per worker rather than on the first frame.
+    import face_recognition  # noqa: F401
+
+
+def _ping():
+    return os.getpid()
+
+
+def _attach(slot, name):
+    shm = _worker_segments.get(slot)
+    if shm is None or shm.name != name:
+        # The parent replaced this slot's segment with a larger one; drop
+        # the old mapping so it doesn't stay open for the worker's lifetime.
+        if shm is not None:
+            shm.close()
+        shm = shared_memory.SharedMemory(name=name)
+        # The parent owns the segment; stop this process's tracker from
+        # unlinking it when the worker exits.
+        resource_tracker.unregister(shm._name, "shared_memory")
+        _worker_segments[slot] = shm
+    return shm
+
+
+def _locate(slot, name, shape, scale, model):
+    import cv2
+    import face_recognition
+    shm = _attach(slot, name)
+    rgb = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    if scale != 1.0:
+        small = cv2.resize(rgb, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    else:
+        small = rgb
+    height, width = shape[:2]
+    boxes = []
+    for top, right, bottom, left in face_recognition.face_locations(small, model=model):
+        boxes.append((
+            max(0, int(top / scale)),
+            min(width, int(right / scale)),
+            min(height, int(bottom / scale)),
+            max(0, int(left / scale)),
+        ))
+    return boxes
+
+
+def _encode(slot, name, shape, boxes):
+    import face_recognition
+    shm = _attach(slot, name)
+    rgb = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    # Encode on the full-resolution pixels so landmarks stay accurate.
+    return [enc.astype(np.float32) for enc in face_recognition.face_encodings(rgb, boxes)]
+
+
+class RecognitionJob:
+    """One frame loaded into a shared memory slot, detected and encoded in steps.
+
+    Work is submitted without blocking, so several jobs can keep every worker
+    busy. The slot is reused only once the job is closed and every task reading
+    it has finished, including any whose caller stopped waiting.
+    """
+
+    def __init__(self, engine, slot, shm, shape, timeout):
+        self.engine = engine
+        self.slot = slot
+        self.shm = shm
+        self.shape = shape
+        self.timeout = timeout
+        self._outstanding = 0
+        self._closed = False
+
+    def _submit(self, fn, args):
+        with self.engine._cond:
+            self._outstanding += 1
+        return self.engine._pool.apply_async(fn, args, callback=self._finished, error_callback=self._finished)
+
+    def _finished(self, _):
+        with self.engine._cond:
+            self._outstanding -= 1
+            release = self._closed and not self._outstanding
+        if release:
+            self.engine._release(self.slot)
+
+    def close(self):
+        with self.engine._cond:
+            if self._closed:
+                return
+            self._closed = True
+            release = not self._outstanding
+        if release:
+            self.engine._release(self.slot)
+
+    def locate_async(self):
+        return self._submit(_locate, (self.slot, self.shm.name, self.shape, self.engine.scale, self.engine.model))
+
+    def encode_async(self, boxes):
+        return self._submit(_encode, (self.slot, self.shm.name, self.shape, list(boxes)))
+
+
+class RecognitionEngine:
+    """Face detection and encoding in a process pool fed through shared memory."""
+
+    def __init__(self, workers=None, scale=0.5, model="hog"):
+        self.workers = workers or os.cpu_count() or 1
+        self.scale = scale
+        self.model = model
+        self.skipped_frames = 0
+        self.skipped_by = Counter()
+        self.ready = False
+        self._pool = None
+        self._segments = [None] * self.workers
+        self._free = list(range(self.workers))
+        self._waiting = deque()
+        self._cond = Condition()
+
+    def start(self):
+        # Fork before the server starts its threads so workers inherit a clean state.
+        if self._pool is None:
+            self._pool = mp.get_context("fork").Pool(self.workers, initializer=_init_worker)
+        return self
+
+    def wait_ready(self, timeout=None):
+        # Tasks only run once a worker's initializer has loaded the models.
+        self._pool.apply_async(_ping).get(timeout)
+        self.ready = True
+        return self
+
+    def _segment(self, slot, nbytes):
+        # Each slot grows to the largest region it has carried; workers
+        # close their mapping of the old segment when they next see the slot.
+        shm = self._segments[slot]
+        if shm is None or shm.size < nbytes:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._segments[slot] = shm
+        return shm
+
+    def _acquire(self, wait):
+        # Slots go to callers in arrival order, so a camera that releases a
+        # slot can't grab it straight back while another camera is waiting.
+        deadline = time.time() + wait
+        ticket = object()
+        with self._cond:
+            self._waiting.append(ticket)
+            try:
+                while not (self._free and self._waiting[0] is ticket):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+                return self._free.pop()
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+
+    def _release(self, slot):
+        with self._cond:
+            self._free.append(slot)
+            self._cond.notify_all()
+
+    def open_job(self, rgb, timeout=30, owner=None, wait=0.0):
+        """A RecognitionJob holding a worker slot until close(), or None when
+        no worker frees up within `wait`."""
+        slot = self._acquire(wait)
+        if slot is None:
+            self.skipped_frames += 1
+            self.skipped_by[owner] += 1
+            return None
+        try:
+            rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+            shm = self._segment(slot, rgb.nbytes)
+            np.copyto(np.ndarray(rgb.shape, dtype=np.uint8, buffer=shm.buf), rgb)
+        except Exception:
+            self._release(slot)
+            raise
+        return RecognitionJob(self, slot, shm, rgb.shape, timeout)
+
+    def map(self, fn, items, limit=None):
+        """Runs fn over items on the recognition workers, yielding results in
+        order. Each task holds a slot like a camera frame, and at most `limit`
+        (default: all but one worker) run at once, so live recognition keeps
+        a worker while a retrain is in progress."""
+        limit = limit or max(1, self.workers - 1)
+        pending = deque()
+        for item in items:
+            if len(pending) >= limit:
+                yield pending.popleft().get()
+            slot = None
+            while slot is None:
+                slot = self._acquire(wait=1.0)
+            release = lambda _, slot=slot: self._release(slot)
+            pending.append(self._pool.apply_async(fn, (item,), callback=release, error_callback=release))
+        while pending:
+            yield pending.popleft().get()
@@ -0,0 +1,172 @@
+import logging
+import os
+import queue
+import time
+from threading import Lock, Thread
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# OpenCV picks the container from the extension, so keep it matched to the codec.
+CLIP_CONTAINERS = {"mp4v": ".mp4", "avc1": ".mp4", "XVID": ".avi", "MJPG": ".avi"}
+
+
+class ClipRecorder:
+    """Writes event clips (pre-roll + live frames + post-roll) on a background thread."""
+
+    def __init__(self, directory="static/videos", fps=10, codec="mp4v",
+                 post_roll=5.0, max_length=60.0, max_queue=300, decode=None):
+        self.directory = directory
+        # Frames may be queued still compressed; decode turns them into arrays
+        # on the writer thread, so only clips that are written pay for it.
+        self.decode = decode
+        self.fps = fps
+        self.codec = codec
+        self.extension = CLIP_CONTAINERS.get(codec, ".avi")
+        self.post_roll = post_roll
+        self.max_length = max_length
+        self.clips_written = 0
+        self.dropped_frames = 0
+        self.last_encode_time = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = Lock()
+        self._active = None
+        self._thread = None
+        # Called as on_saved(path, poster_frame) once a clip is finalised.
+        self.on_saved = None
+        # Called as on_failed(path) when a clip could not be written.
+        self.on_failed = None
+        # Called as observe(stage, seconds) for each frame written.
+        self.observe = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    @property
+    def recording(self):
+        return self._active is not None
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            "recording": self.recording,
+            "queue_depth": self.queue_depth,
+            "clips_written": self.clips_written,
+            "dropped_frames": self.dropped_frames,
+            "last_encode_time": self.last_encode_time,
+        }
+
+    def start_clip(self, base_name, pre_roll):
+        """Opens a clip seeded with the pre-roll frames and returns its URL path,
+        or extends the clip already being recorded."""
+        with self._lock:
+            if self._active is not None:
+                self._extend()
+                return self._active["url"]
+            filename = f"{base_name}{self.extension}"
+            now = time.time()
+            self._active = {
+                "url": f"/static/videos/{filename}",
+                "started": now,
+                "deadline": now + self.post_roll,
+            }
+            # The frame that triggered the event doubles as the clip's poster.
+            poster = pre_roll[-1] if pre_roll else None
+            self._put(("open", (os.path.join(self.directory, filename), poster)), block=True)
+            for frame in pre_roll:
+                self._put(("frame", frame))
+            return self._active["url"]
+
+    def extend(self):
+        with self._lock:
+            if self._active is not None:
+                self._extend()
+
+    def _extend(self):
+        limit = self._active["started"] + self.max_length
+        self._active["deadline"] = min(time.time() + self.post_roll, limit)
+
+    def add_frame(self, frame):
+        with self._lock:
+            if self._active is None:
+                return
+            if time.time() > self._active["deadline"]:
+                self._active = None
+                self._put(("close", None), block=True)
+                return
+            self._put(("frame", frame))
+
+    def _put(self, item, block=False):
+        try:
+            self._queue.put(item, block=block)
+        except queue.Full:
+            self.dropped_frames += 1
+
+    def _close_due(self):
+        # Capture can stall or lose the camera mid-clip, so the writer closes
+        # on the deadline rather than waiting for add_frame to see it. Frames
+        # are only queued under the lock, so an empty queue here has nothing
+        # left for the clip.
+        with self._lock:
+            if self._active is None or time.time() <= self._active["deadline"] or not self._queue.empty():
+                return False
+            self._active = None
+            return True
+
+    def _discard(self, out, path):
+        if out is not None:
+            try:
+                out.release()
+            except Exception as e:
+                logger.error(f"Error releasing video writer: {e}")
+        if path is not None and self.on_failed:
+            self.on_failed(path)
+
+    def _run(self):
+        out, path, poster, encode_time = None, None, None, 0.0
+        while True:
+            try:
+                kind, payload = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if not self._close_due():
+                    continue
+                kind, payload = "close", None
+            try:
+                if kind == "open":
+                    (path, poster), out, encode_time = payload, None, 0.0
+                elif kind == "frame" and path is not None:
+                    started = time.time()
+                    if self.decode is not None:
+                        payload = self.decode(payload)
+                    if out is None:
+                        height, width = payload.shape[:2]
+                        out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.codec), self.fps, (width, height))
+                    out.write(payload)
+                    encode_time += time.time() - started
+                    if self.observe:
+                        self.observe("clip_write", time.time() - started)
+                elif kind == "close" and path is not None:
+                    if out is None:
+                        raise RuntimeError(f"no frames were recorded for {path}")
+                    started = time.time()
+                    out.release()
+                    encode_time += time.time() - started
+                    self.clips_written += 1
+                    self.last_encode_time = round(encode_time, 3)
+                    logger.info(f"Video saved: {path} ({encode_time:.2f}s encoding)")
+                    if self.on_saved:
+                        if poster is not None and self.decode is not None:
+                            poster = self.decode(poster)
+                        self.on_saved(path, poster)
+                    out, path, poster = None, None, None
+            except Exception as e:
+                logger.error(f"Error saving video: {e}")
+                self._discard(out, path)
+                out, path, poster = None, None, None
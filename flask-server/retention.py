@@ -0,0 +1,159 @@
+import logging
+import os
+import shutil
+import time
+from collections import Counter
+from threading import Thread
+
+logger = logging.getLogger(__name__)
+
+
+def _remove_paths(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def directory_files(directory, companions=None, min_age=60):
+    """Lister for the files in `directory`. companions(name) names extra files,
+    such as thumbnails, that are counted and removed along with each one."""
+    def files():
+        if not os.path.isdir(directory):
+            return []
+        now = time.time()
+        found = []
+        for entry in os.scandir(directory):
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            # Anything this fresh may still be being written.
+            if now - stat.st_mtime < min_age:
+                continue
+            paths = [entry.path] + [p for p in (companions(entry.name) if companions else []) if os.path.exists(p)]
+            size = stat.st_size + sum(os.path.getsize(p) for p in paths[1:])
+            found.append((stat.st_mtime, size, lambda paths=paths: _remove_paths(paths), entry.name))
+        return found
+    return files
+
+
+class RetentionWorker:
+    """Keeps recorded media within a disk budget.
+
+    Each pass deletes whatever is past its category's max age, then the oldest
+    files, one category at a time in the order they were added, until the
+    total fits max_bytes and the disk under `root` has min_free_bytes free.
+    """
+
+    def __init__(self, max_bytes=None, min_free_bytes=None, root=".", interval=300):
+        self.max_bytes = max_bytes
+        self.min_free_bytes = min_free_bytes
+        self.root = root
+        self.interval = interval
+        # name -> (lister, max age in seconds or None). A lister returns
+        # (timestamp, size, remove, key) for every file it is willing to delete.
+        self.categories = {}
+        self.usage = {}
+        self.deleted = Counter()
+        self.freed_bytes = 0
+        self.last_run = None
+        # Called as observe(stage, seconds) after each pass.
+        self.observe = None
+        self._removed = {}
+        # Called as on_deleted(name, keys) after a pass that removed anything.
+        self.on_deleted = None
+        self._thread = None
+
+    def add(self, name, lister, max_age_days=None):
+        self.categories[name] = (lister, max_age_days * 86400 if max_age_days else None)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stats(self):
+        return {
+            "usage_bytes": dict(self.usage),
+            "max_bytes": self.max_bytes,
+            "min_free_bytes": self.min_free_bytes,
+            "deleted": dict(self.deleted),
+            "freed_bytes": self.freed_bytes,
+            "last_run": self.last_run,
+        }
+
+    def _delete(self, name, item):
+        try:
+            item[2]()
+        except Exception as e:
+            logger.error(f"Retention could not delete {name} item: {e}")
+            return False
+        self.deleted[name] += 1
+        self.freed_bytes += item[1]
+        self._removed.setdefault(name, []).append(item[3])
+        return True
+
+    def run_once(self):
+        started = time.time()
+        self._removed = {}
+        files = {}
+        for name, (lister, max_age) in self.categories.items():
+            try:
+                items = sorted(lister(), key=lambda item: item[0])
+            except Exception as e:
+                logger.error(f"Retention could not list {name}: {e}")
+                items = []
+            if max_age:
+                kept, removed = [], 0
+                for item in items:
+                    if started - item[0] > max_age and self._delete(name, item):
+                        removed += 1
+                    else:
+                        kept.append(item)
+                items = kept
+                if removed:
+                    logger.info(f"Retention removed {removed} {name} older than {max_age / 86400:g} days")
+            files[name] = items
+
+        total = sum(item[1] for items in files.values() for item in items)
+        free = shutil.disk_usage(self.root).free if self.min_free_bytes else None
+
+        def over_budget():
+            return ((self.max_bytes and total > self.max_bytes)
+                    or (self.min_free_bytes and free < self.min_free_bytes))
+
+        for name, items in files.items():
+            evicted = 0
+            while evicted < len(items) and over_budget():
+                item = items[evicted]
+                evicted += 1
+                if self._delete(name, item):
+                    total -= item[1]
+                    if free is not None:
+                        free += item[1]
+            files[name] = items[evicted:]
+            if evicted:
+                logger.info(f"Retention evicted the {evicted} oldest {name} to stay within the disk budget")
+        if over_budget():
+            logger.warning("Retention could not get media within the disk budget")
+
+        self.usage = {name: sum(item[1] for item in items) for name, items in files.items()}
+        if self.on_deleted:
+            for name, keys in self._removed.items():
+                try:
+                    self.on_deleted(name, keys)
+                except Exception as e:
+                    logger.error(f"Retention callback error for {name}: {e}")
+        self.last_run = time.time()
+        if self.observe:
+            self.observe("retention_pass", self.last_run - started)
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Retention error: {e}")
+            time.sleep(self.interval)
@@ -0,0 +1,81 @@
+import logging
+import time
+from threading import Condition, Thread
+
+logger = logging.getLogger(__name__)
+
+
+class RetrainScheduler:
+    """Runs one retrain at a time, merging bursts of requests into a single job."""
+
+    def __init__(self, job, debounce=2.0):
+        self.job = job
+        self.debounce = debounce
+        self._cond = Condition()
+        self._dirty = False
+        self._last_request = 0.0
+        self._thread = None
+        self._status = {
+            "state": "idle",
+            "pending_requests": 0,
+            "runs": 0,
+            "progress": None,
+            "last_started": None,
+            "last_finished": None,
+            "last_duration": None,
+            "last_result": None,
+            "last_error": None,
+        }
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def request(self):
+        with self._cond:
+            self._dirty = True
+            self._last_request = time.time()
+            self._status["pending_requests"] += 1
+            if self._status["state"] == "idle":
+                self._status["state"] = "pending"
+            self._cond.notify_all()
+        self.start()
+
+    def status(self):
+        with self._cond:
+            return dict(self._status)
+
+    def _progress(self, done, total):
+        with self._cond:
+            self._status["progress"] = {"done": done, "total": total}
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._dirty)
+                # Wait for the burst to go quiet so several uploads share one job.
+                while time.time() - self._last_request < self.debounce:
+                    self._cond.wait(self.debounce - (time.time() - self._last_request))
+                self._dirty = False
+                merged = self._status["pending_requests"]
+                self._status.update(state="running", pending_requests=0, progress=None,
+                                    last_started=time.time())
+            logger.info(f"Retrain started for {merged} queued request(s)")
+            started = time.time()
+            result, error = None, None
+            try:
+                result = self.job(progress=self._progress)
+            except Exception as e:
+                logger.error(f"Retraining failed: {e}")
+                error = str(e)
+            with self._cond:
+                self._status.update(
+                    state="pending" if self._dirty else "idle",
+                    runs=self._status["runs"] + 1,
+                    last_finished=time.time(),
+                    last_duration=round(time.time() - started, 3),
+                    last_result=result,
+                    last_error=error,
+                )
@@ -1,29 +1,56 @@
-from flask import Flask, Response, jsonify, request, send_from_directory, send_file
+from flask import Flask, Response, jsonify, request, send_from_directory
 from flask_cors import CORS
-import face_recognition
 import cv2
 import numpy as np
 import time
-import pickle
 import os
-import requests
-import RPi.GPIO as GPIO
+import shutil
 from datetime import datetime
-from threading import Thread, Lock
+from threading import Thread, Lock, Condition
 from collections import deque
-from imutils import paths
 import logging
 import json
-import adafruit_fingerprint
-from adafruit_fingerprint import Adafruit_Fingerprint
-
-print("Fingerprint module path:", adafruit_fingerprint.__file__)
-
+from face_index import FaceIndex
+from encoding_cache import EncodingCache
+from encoding_store import EncodingStore
+from retrain_scheduler import RetrainScheduler
+from recognition import RecognitionEngine
+from tracker import FaceTracker
+from push import PushDispatcher
+from event_store import EventStore
+from change_feed import ChangeFeed
+from media import Thumbnails, send_media
+from dataset_index import DatasetIndex
+from fingerprint_sensor import FingerprintSensor, FingerprintError, FakeFingerprint
+from hardware import open_gpio
+from cameras import CameraPipeline, load_camera_config
+from dvr import SegmentIndex, avi_clip
+from retention import RetentionWorker, directory_files
+from metrics import Registry
+
+# HARDWARE_BACKEND=sim runs everything off-device: the camera replays
+# CAMERA_SOURCE, the lock pin lives in memory and the fingerprint sensor is
+# scripted. Each part can also be picked individually.
+HARDWARE_BACKEND = os.environ.get("HARDWARE_BACKEND", "pi")
+SIMULATED = HARDWARE_BACKEND == "sim"
+CAMERA_BACKEND = os.environ.get("CAMERA_BACKEND", "file" if SIMULATED else "picamera")
+CAMERA_SOURCE = os.environ.get("CAMERA_SOURCE")
+LOCK_BACKEND = os.environ.get("LOCK_BACKEND", "memory" if SIMULATED else "gpio")
+
+# cameras.json lists every camera; without it the single camera above is "front".
+CAMERAS_FILE = "cameras.json"
+camera_config = load_camera_config(CAMERAS_FILE, {"name": "front", "backend": CAMERA_BACKEND, "source": CAMERA_SOURCE})
+DEFAULT_CAMERA = camera_config[0]["name"]
 
 FINGERPRINT_MAP_FILE = "fingerprint_map.json"
 fingerprint_map = {}
 pending_verification = None
 pending_lock = Lock()
+pending_cond = Condition(pending_lock)
+FINGERPRINT_WINDOW_SECONDS = 30
+FINGERPRINT_POLL_INTERVAL = 0.05
+handoff_wakeups = deque(maxlen=100)
+handoff_unlocks = deque(maxlen=100)
 
 if os.path.exists(FINGERPRINT_MAP_FILE):
     with open(FINGERPRINT_MAP_FILE, "r") as f:
@@ -33,6 +60,36 @@ def save_fingerprint_map():
     with open(FINGERPRINT_MAP_FILE, "w") as f:
         json.dump(fingerprint_map, f)
 
+FINGERPRINT_BACKEND = os.environ.get("FINGERPRINT_BACKEND", "fake" if SIMULATED else "uart")
+
+def open_fingerprint_sensor():
+    if FINGERPRINT_BACKEND == "fake":
+        return FakeFingerprint()
+    import serial
+    from adafruit_fingerprint import Adafruit_Fingerprint
+    uart = serial.Serial("/dev/ttyAMA0", baudrate=57600, timeout=1)
+    return Adafruit_Fingerprint(uart)
+
+fingerprint_sensor = FingerprintSensor(open_fingerprint_sensor)
+
+def set_pending_verification(value, reason=None):
+    global pending_verification
+    with pending_cond:
+        pending_verification = value
+        pending_cond.notify_all()
+        # Published under the lock so concurrent changes reach the feed in
+        # the order they were made.
+        change_feed.publish("auth_status", auth_status_payload(value, reason))
+
+def auth_status_payload(pending, reason=None):
+    payload = {"awaiting_fingerprint": bool(pending)}
+    if pending:
+        payload["name"] = pending["name"]
+        payload["camera"] = pending.get("camera")
+    if reason:
+        payload["reason"] = reason
+    return payload
+
 
 
 # Logging
@@ -44,53 +101,226 @@ app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
 # Global variables
-PI_HARDWARE_AVAILABLE = True
-picam2 = None
-known_face_encodings = []
-known_face_names = []
-detection_lock = Lock()
-latest_detections = []
-frame_buffer = deque(maxlen=100)
-last_encoded_frame = None
-motion_detection_enabled = True
+CAPTURE_FPS = 30
+face_index = FaceIndex()
+FACE_MATCH_TOLERANCE = 0.5
+FACE_MATCH_CENTROIDS = False
+encoding_store = EncodingStore("encodings.json", legacy_pickle="encodings.pickle")
+FACE_DETECTION_SCALE = 0.5
+recognition_engine = RecognitionEngine(workers=os.cpu_count(), scale=FACE_DETECTION_SCALE)
+# Retrains encode on the recognition workers rather than forking a second
+# pool from this (threaded) process and loading dlib into it again.
+encoding_cache = EncodingCache("encoding_cache.json", mapper=recognition_engine.map)
+event_store = EventStore("events.db", default_camera=DEFAULT_CAMERA)
+change_feed = ChangeFeed(maxlen=1000)
+event_store.listeners.append(
+    lambda op, entry: change_feed.publish("detection" if op == "insert" else "detection_update", entry))
+RECORD_FPS = 10
+PRE_ROLL_SECONDS = 5
+POST_ROLL_SECONDS = 5
+MOTION_CONFIG_FILE = "motion_config.json"
+motion_config = {"cameras": {}}
+if os.path.exists(MOTION_CONFIG_FILE):
+    with open(MOTION_CONFIG_FILE, "r") as f:
+        saved = json.load(f)
+    # Files from before multi-camera support hold one camera's settings at the top level.
+    motion_config["cameras"] = saved.get("cameras") or {DEFAULT_CAMERA: saved}
+
+def camera_motion_config(name):
+    config = {"sensitivity": 0.5, "zones": []}
+    config.update(motion_config["cameras"].get(name, {}))
+    return config
+
+def decode_stream_jpeg(jpeg):
+    # The stream is encoded with red and blue swapped relative to the capture
+    # frames; swap back so clips match the snapshots.
+    frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=frame)
+
+thumbnails = Thumbnails("static/thumbs", sources={
+    "images": "static/images",
+    "videos": "static/videos",
+    "dataset": "dataset"
+})
+
+# Clip filename -> the event it belongs to. The video is only attached to the
+# event once the recorder has finalised the file, so nobody fetches a partial mp4.
+pending_clips = {}
+
+def finalise_clip(path, poster):
+    filename = os.path.basename(path)
+    if poster is not None:
+        thumbnails.write("videos", filename, poster)
+    ref = pending_clips.pop(filename, None)
+    if ref is not None:
+        event_store.update(ref, {"video": f"/static/videos/{filename}",
+                                 "video_poster": thumbnails.url_for("videos", filename)})
+
+def discard_clip(path):
+    # The event keeps "video": None rather than pointing at a broken file.
+    pending_clips.pop(os.path.basename(path), None)
 
-# GPIO Setup
+motion_detection_enabled = True
+FACE_FALLBACK_INTERVAL = 2
+# How long a camera queues for a recognition worker before skipping the frame.
+FACE_SLOT_WAIT = 0.5
+# How often the face loop checks on frames still being located.
+FACE_POLL_INTERVAL = 0.02
+ROI_PADDING = 0.3
+ROI_MIN_SIZE = 160
+
+# DVR mode records every camera, or those with "dvr": true in cameras.json,
+# into rolling segments under dvr/ that /clips serves back by time range.
+DVR_ENABLED = os.environ.get("DVR_ENABLED", "0") == "1"
+DVR_SEGMENT_SECONDS = int(os.environ.get("DVR_SEGMENT_SECONDS", 60))
+DVR_MAX_CLIP_SECONDS = 3600
+segment_index = SegmentIndex("dvr") if any(c.get("dvr", DVR_ENABLED) for c in camera_config) else None
+
+def build_camera(config):
+    cam = CameraPipeline(
+        config["name"], config.get("backend", CAMERA_BACKEND), source=config.get("source"),
+        size=config.get("size", (640, 480)), record_fps=RECORD_FPS, pre_roll=PRE_ROLL_SECONDS,
+        post_roll=POST_ROLL_SECONDS, decode=decode_stream_jpeg, motion_config=camera_motion_config(config["name"]),
+        tracker=FaceTracker(iou_threshold=0.3, max_distance=FACE_MATCH_TOLERANCE, ttl=5.0, reverify_interval=3.0),
+        segment_index=segment_index if config.get("dvr", DVR_ENABLED) else None, segment_seconds=DVR_SEGMENT_SECONDS)
+    cam.recorder.on_saved = finalise_clip
+    cam.recorder.on_failed = discard_clip
+    return cam
+
+cameras = {config["name"]: build_camera(config) for config in camera_config}
+
+def get_camera(name=None):
+    return cameras.get(name or DEFAULT_CAMERA)
+
+# Disk budget for recorded media, overridable in retention.json. Over budget,
+# the oldest DVR footage goes first, then event clips, then snapshots.
+RETENTION_FILE = "retention.json"
+GB = 1024 ** 3
+retention_config = {"max_gb": 8, "min_free_gb": 0.5, "interval_seconds": 300,
+                    "max_age_days": {"segments": 7, "clips": 30, "snapshots": 30}}
+if os.path.exists(RETENTION_FILE):
+    with open(RETENTION_FILE, "r") as f:
+        overrides = json.load(f)
+    retention_config["max_age_days"].update(overrides.pop("max_age_days", {}))
+    retention_config.update(overrides)
+retention = RetentionWorker(
+    max_bytes=retention_config["max_gb"] * GB if retention_config["max_gb"] else None,
+    min_free_bytes=retention_config["min_free_gb"] * GB if retention_config["min_free_gb"] else None,
+    interval=retention_config["interval_seconds"])
+max_age_days = retention_config["max_age_days"]
+if segment_index is not None:
+    retention.add("segments", segment_index.files, max_age_days.get("segments"))
+retention.add("clips", directory_files("static/videos", lambda name: [thumbnails.path_for("videos", name)]),
+              max_age_days.get("clips"))
+retention.add("snapshots", directory_files("static/images", lambda name: [thumbnails.path_for("images", name)]),
+              max_age_days.get("snapshots"))
+
+def expire_event_media(category, filenames):
+    # Events keep pointing at their media; clear the links retention just broke.
+    folder = {"clips": "videos", "snapshots": "images"}.get(category)
+    if folder:
+        event_store.expire_media([f"/static/{folder}/{name}" for name in filenames])
+
+retention.on_deleted = expire_event_media
+
+# GPIO is opened by initialize_lock(), not at import time
 LOCK_GPIO_PIN = 18
-GPIO.setwarnings(False)
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(LOCK_GPIO_PIN, GPIO.OUT)
-GPIO.output(LOCK_GPIO_PIN, 1)
-
-EXPO_PUSH_ENDPOINT = 'https://exp.host/--/api/v2/push/send'
-EXPO_DEVICE_PUSH_TOKEN = None
-
-try:
-    with open("encodings.pickle", "rb") as f:
-        data = pickle.load(f)
-        known_face_encodings = data["encodings"]
-        known_face_names = data["names"]
-        logger.info(f"Loaded {len(known_face_names)} encodings")
-except Exception as e:
-    logger.error(f"Encoding load error: {e}")
+GPIO = None
+
+EXPO_PUSH_ENDPOINT = os.environ.get("EXPO_PUSH_ENDPOINT", 'https://exp.host/--/api/v2/push/send')
+push_dispatcher = PushDispatcher(EXPO_PUSH_ENDPOINT, tokens_file="push_tokens.json", window=2.0)
+
+# Pipeline instrumentation, served by /metrics
+metrics = Registry()
+HEARTBEAT_INTERVAL = 5
+for pipeline in cameras.values():
+    pipeline.broadcaster.observe = metrics.observe
+    pipeline.recorder.observe = metrics.observe
+    if pipeline.dvr is not None:
+        pipeline.dvr.observe = metrics.observe
+retention.observe = metrics.observe
+push_dispatcher.observe = metrics.observe
+metrics.gauge("queue_depth", "Items waiting in each background queue.", lambda: {
+    "push": push_dispatcher.queue_depth,
+    "events": event_store.queue_depth,
+    "fingerprint": fingerprint_sensor.queue_depth,
+}, label="queue")
+metrics.gauge("clip_queue_depth", "Frames waiting to be written to a clip.",
+              lambda: {name: cam.recorder.queue_depth for name, cam in cameras.items()}, label="camera")
+metrics.counter("dropped_frames_total", "Frames skipped because a stage could not keep up.", lambda: {
+    key: value for name, cam in cameras.items() for key, value in (
+        (("stream", name), cam.broadcaster.dropped_frames),
+        (("clips", name), cam.recorder.dropped_frames),
+        (("recognition", name), recognition_engine.skipped_by[name]),
+        (("dvr", name), cam.dvr.dropped_frames if cam.dvr else 0),
+    )
+}, label=("stage", "camera"))
+metrics.counter("push_notifications_total", "Push notifications by outcome.", lambda: {
+    "sent": push_dispatcher.sent,
+    "failed": push_dispatcher.failed,
+    "dropped": push_dispatcher.dropped,
+}, label="result")
+metrics.counter("frames_captured_total", "Frames read from each camera.",
+                lambda: {name: cam.bus.seq for name, cam in cameras.items()}, label="camera")
+metrics.counter("clips_written_total", "Event clips finalised.",
+                lambda: {name: cam.recorder.clips_written for name, cam in cameras.items()}, label="camera")
+metrics.gauge("stream_clients", "Connected /video_feed viewers.",
+              lambda: {name: cam.broadcaster.subscribers for name, cam in cameras.items()}, label="camera")
+metrics.gauge("stream_tier_clients", "Connected /video_feed viewers on each stream tier.", lambda: {
+    (name, tier): stats["viewers"] for name, cam in cameras.items() for tier, stats in cam.broadcaster.tier_stats().items()
+}, label=("camera", "tier"))
+metrics.counter("stream_frames_encoded_total", "JPEGs encoded for each stream tier, shared by all its viewers.", lambda: {
+    (name, tier): stats["encoded"] for name, cam in cameras.items() for tier, stats in cam.broadcaster.tier_stats().items()
+}, label=("camera", "tier"))
+metrics.counter("dvr_frames_written_total", "Frames written to DVR segments.",
+                lambda: {name: cam.dvr.frames_written for name, cam in cameras.items() if cam.dvr}, label="camera")
+metrics.gauge("media_bytes", "Disk used by recorded media at the last retention pass.",
+              lambda: retention.usage, label="category")
+metrics.counter("retention_deleted_total", "Media files removed to stay within the disk budget.",
+                lambda: dict(retention.deleted), label="category")
+metrics.gauge("face_tracks", "Faces currently being tracked.",
+              lambda: {name: len(cam.tracker.tracks) for name, cam in cameras.items()}, label="camera")
+
+# Startup runs in phases: HTTP and the lock answer straight away while the
+# camera and the recognition stack come up in the background.
+startup_phases = {"lock": False, "camera": False, "encodings": False, "recognition": False}
+
+def mark_ready(phase):
+    startup_phases[phase] = True
+    logger.info(f"Startup phase ready: {phase}")
+
+def load_encodings():
+    global face_index
+    try:
+        matrix, names = encoding_store.load()
+        face_index = FaceIndex(matrix, names, use_centroids=FACE_MATCH_CENTROIDS)
+        logger.info(f"Loaded {len(face_index)} encodings")
+        mark_ready("encodings")
+    except Exception as e:
+        logger.error(f"Encoding load error: {e}")
 
 os.makedirs("static/images", exist_ok=True)
 os.makedirs("static/videos", exist_ok=True)
 os.makedirs("dataset", exist_ok=True)
+dataset_index = DatasetIndex("dataset")
 
-def initialize_hardware():
-    global picam2, PI_HARDWARE_AVAILABLE
+def initialize_lock():
+    global GPIO
     try:
-        from picamera2 import Picamera2
-        picam2 = Picamera2()
-        config = picam2.create_preview_configuration(main={"size": (640, 480)})
-        picam2.configure(config)
-        picam2.start()
-        logger.info("Camera initialized")
+        GPIO = open_gpio(LOCK_BACKEND)
+        GPIO.setwarnings(False)
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(LOCK_GPIO_PIN, GPIO.OUT)
+        GPIO.output(LOCK_GPIO_PIN, 1)
+        logger.info(f"Lock GPIO initialized ({LOCK_BACKEND})")
     except Exception as e:
-        logger.error(f"Camera init failed: {e}")
-        PI_HARDWARE_AVAILABLE = False
+        logger.error(f"Lock GPIO init failed: {e}")
+        GPIO = None
 
 def unlock_lock_for_seconds(seconds=5):
+    if GPIO is None:
+        logger.error("Lock GPIO not available")
+        return
     logger.info(f"Unlocking lock for {seconds} seconds")
     GPIO.setup(LOCK_GPIO_PIN, GPIO.OUT)
     GPIO.output(LOCK_GPIO_PIN, 0)
@@ -100,267 +330,395 @@ def unlock_lock_for_seconds(seconds=5):
     logger.info("Lock re-locked and pin set to INPUT")
 
 def lock_immediately():
+    if GPIO is None:
+        logger.error("Lock GPIO not available")
+        return
     logger.info("Locking immediately")
     GPIO.setup(LOCK_GPIO_PIN, GPIO.OUT)
     GPIO.output(LOCK_GPIO_PIN, 1)
     GPIO.setup(LOCK_GPIO_PIN, GPIO.IN)
     logger.info("Lock set to HIGH and pin set to INPUT")
 
-def save_video_clip(frames, filename="latest.avi", fps=10):
-    try:
-        height, width, _ = frames[0].shape
-        video_path = os.path.join("static/videos", filename)
-        out = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'XVID'), fps, (width, height))
-        for frame in frames:
-            out.write(frame)
-        out.release()
-        time.sleep(0.2)
-        if os.path.exists(video_path):
-            logger.info(f"Video saved: {video_path}")
-            return f"/static/videos/{filename}"
+def capture_frames(cam):
+    # Sole reader of the camera; every other consumer reads from its bus.
+    interval = 1.0 / CAPTURE_FPS
+    while True:
+        metrics.heartbeat(f"capture-{cam.name}")
+        if cam.camera and cam.available:
+            started = time.time()
+            try:
+                with metrics.time("capture"):
+                    frame = cam.camera.capture_array()
+                cam.bus.publish(frame)
+            except Exception as e:
+                logger.error(f"Capture error ({cam.name}): {e}")
+                time.sleep(1)
+                continue
+            time.sleep(max(0.0, interval - (time.time() - started)))
         else:
-            logger.error(f"File does not exist after saving: {video_path}")
-            return None
-    except Exception as e:
-        logger.error(f"Error saving video: {e}")
-        return None
-
+            time.sleep(1)
 
+def face_rois(boxes, shape):
+    # Pad each motion box (a face sits above the moving body), enforce a
+    # minimum size for the HOG window, then merge overlapping regions.
+    height, width = shape[:2]
+    rois = []
+    for x, y, w, h in boxes:
+        pad_w = max(int(w * ROI_PADDING), (ROI_MIN_SIZE - w) // 2, 0)
+        pad_h = max(int(h * ROI_PADDING), (ROI_MIN_SIZE - h) // 2, 0)
+        rois.append([max(0, x - pad_w), max(0, y - pad_h), min(width, x + w + pad_w), min(height, y + h + pad_h)])
+    merged = []
+    for roi in sorted(rois):
+        for other in merged:
+            if roi[0] <= other[2] and roi[2] >= other[0] and roi[1] <= other[3] and roi[3] >= other[1]:
+                other[:] = [min(roi[0], other[0]), min(roi[1], other[1]), max(roi[2], other[2]), max(roi[3], other[3])]
+                break
+        else:
+            merged.append(roi)
+    return merged
 
-def detect_motion():
-    global latest_detections
-    last_frame_gray = None
+def detect_motion(cam):
     last_motion_time = 0
+    last_seq = 0
     cooldown_seconds = 10
+    interval = 1.0 / RECORD_FPS
     while True:
+        metrics.heartbeat(f"motion-{cam.name}")
         if not motion_detection_enabled:
             time.sleep(0.5)
             continue
-        if picam2 and PI_HARDWARE_AVAILABLE:
+        if cam.camera and cam.available:
+            started = time.time()
             try:
-                frame = picam2.capture_array()
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                frame_bgr = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2BGR)
-                with detection_lock:
-                    frame_buffer.append(frame_bgr)
-                motion_detected = False
-                if last_frame_gray is not None:
-                    frame_diff = cv2.absdiff(last_frame_gray, gray_frame)
-                    _, thresh = cv2.threshold(frame_diff, 30, 255, cv2.THRESH_BINARY)
-                    if cv2.countNonZero(thresh) > 800:
-                        motion_detected = True
-                last_frame_gray = gray_frame
+                last_seq, frame, _ = cam.bus.wait(last_seq)
+                if frame is None:
+                    continue
                 now = time.time()
-                if motion_detected and (now - last_motion_time) > cooldown_seconds:
+                with metrics.time("motion"):
+                    motion_detected, boxes, motion_score = cam.motion.process(frame)
+                # The bus slot is reused by the capture thread, so keep a copy
+                # for the event, and drop the frame if it was overwritten meanwhile.
+                trigger = (motion_detected and not cam.recorder.recording
+                           and (now - last_motion_time) > cooldown_seconds)
+                frame_bgr = frame.copy() if trigger else None
+                if not cam.bus.is_current(last_seq):
+                    continue
+                if motion_detected:
+                    cam.publish_motion(boxes)
+                if motion_detected and cam.recorder.recording:
+                    cam.recorder.extend()
+                elif trigger:
                     last_motion_time = now
                     timestamp = datetime.now().isoformat()
                     img_filename = f"static/images/{timestamp.replace(':', '-')}.jpg"
                     cv2.imwrite(img_filename, frame_bgr)
-                    video_filename = f"{timestamp.replace(':', '-')}.mp4"
-                    video_path = save_video_clip(list(frame_buffer), filename=video_filename)
+                    video_path = cam.recorder.start_clip(timestamp.replace(':', '-'), cam.preroll.frames())
                     detection_entry = {
                         "name": "Motion Detected",
                         "timestamp": timestamp,
+                        "camera": cam.name,
                         "image": f"/{img_filename}",
-                        "video": video_path
+                        "video": None,
+                        "thumbnail": thumbnails.write("images", os.path.basename(img_filename), frame_bgr),
+                        "motion_score": round(motion_score, 4)
                     }
-                    with detection_lock:
-                        latest_detections = [detection_entry] + latest_detections[:49]
-                    logger.info(f"Motion detected at {timestamp}")
+                    pending_clips[os.path.basename(video_path)] = event_store.add(detection_entry, "motion")
+                    logger.info(f"Motion detected on {cam.name} at {timestamp}")
             except Exception as e:
-                logger.error(f"Motion detection error: {e}")
-        time.sleep(0.5)
+                logger.error(f"Motion detection error ({cam.name}): {e}")
+            time.sleep(max(0.0, interval - (time.time() - started)))
+        else:
+            time.sleep(0.5)
 
+def face_quality(frame, box):
+    top, right, bottom, left = box
+    crop = cv2.cvtColor(frame[top:bottom, left:right], cv2.COLOR_BGR2GRAY)
+    if crop.size == 0:
+        return 0.0
+    sharpness = cv2.Laplacian(crop, cv2.CV_64F).var()
+    return sharpness * ((bottom - top) * (right - left)) ** 0.5
+
+def start_visit(cam, track, frame_bgr):
+    timestamp = datetime.now().isoformat()
+    img_filename = f"static/images/{timestamp.replace(':', '-')}.jpg"
+    cv2.imwrite(img_filename, frame_bgr)
+    thumbnail = thumbnails.write("images", os.path.basename(img_filename), frame_bgr)
+    track.snapshot = img_filename
+    track.snapshot_score = track.best_score
+
+    logger.info(f"Face detected on {cam.name}: {track.name} (track {track.id}, distance {track.distance}) at {timestamp}")
+
+    # Only proceed if it's a known face
+    if track.known:
+        set_pending_verification({
+            "name": track.name,
+            "camera": cam.name,
+            "timestamp": timestamp,
+            "recognized_at": time.time()
+        })
+        logger.info(f"{track.name} recognized. Awaiting fingerprint for unlock.")
+
+        track.event = event_store.add({
+            "name": track.name,
+            "timestamp": timestamp,
+            "camera": cam.name,
+            "image": f"/{img_filename}",
+            "thumbnail": thumbnail,
+            "video": None,
+            "awaiting_fingerprint": True,
+            "visit": track.summary()
+        }, "face")
+
+    # Send push notification regardless
+    push_dispatcher.notify({
+        "name": track.name,
+        "timestamp": timestamp,
+        "camera": cam.name,
+        "image": f"/{img_filename}",
+        "thumbnail": thumbnail,
+        "video": None
+    })
+
+def end_visit(track):
+    # Keep the sharpest, largest view of the face seen during the visit.
+    if track.best_frame is not None and track.snapshot and track.best_score > track.snapshot_score:
+        cv2.imwrite(track.snapshot, track.best_frame)
+        thumbnails.write("images", os.path.basename(track.snapshot), track.best_frame)
+    if track.event is not None:
+        event_store.update(track.event, {"visit": track.summary()})
+    logger.info(f"Visit ended: {track.name} {track.summary()}")
+    track.best_frame = None
+
+def submit_faces(cam, frame_bgr, boxes, wait):
+    """Starts locating faces in each region of the frame, one worker per region.
+    Returns the in-flight batch, or None when no worker was free."""
+    if boxes and motion_detection_enabled:
+        rois = face_rois(boxes, frame_bgr.shape)
+    else:
+        rois = [[0, 0, frame_bgr.shape[1], frame_bgr.shape[0]]]
+    batch = {"frame": frame_bgr, "time": time.time(), "rois": []}
+    for x1, y1, x2, y2 in rois:
+        with metrics.time("colour_convert"):
+            rgb_roi = cv2.cvtColor(frame_bgr[y1:y2, x1:x2], cv2.COLOR_BGR2RGB)
+        job = recognition_engine.open_job(rgb_roi, owner=cam.name, wait=wait)
+        if job is None:
+            continue
+        # Queue for at most one worker per frame; skip the regions that find none.
+        wait = 0.0
+        batch["rois"].append((x1, y1, job, job.locate_async()))
+    return batch if batch["rois"] else None
 
+def batch_located(batch):
+    return all(located.ready() for _, _, _, located in batch["rois"])
 
-def detect_faces():
-    global pending_verification
+def finish_faces(cam, batch):
+    frame_bgr, now = batch["frame"], batch["time"]
+    seen, encoding = [], []
+    try:
+        for x1, y1, job, located in batch["rois"]:
+            local_boxes = located.get(job.timeout)
+            to_full = {b: (b[0] + y1, b[1] + x1, b[2] + y1, b[3] + x1) for b in local_boxes}
+            pairs, to_encode = cam.tracker.associate([to_full[b] for b in local_boxes], now)
+            seen.extend((track, False) for _, track in pairs)
+            if to_encode:
+                # Only faces that are new or due for re-verification are encoded.
+                from_full = {v: k for k, v in to_full.items()}
+                encoding.append((job, to_encode, job.encode_async([from_full[box] for box, _ in to_encode])))
+        metrics.observe("face_detection", time.time() - now)
+        started = time.time()
+        for job, to_encode, encoded in encoding:
+            encodings = encoded.get(job.timeout)
+            with metrics.time("face_matching"):
+                matches = face_index.match(encodings, tolerance=FACE_MATCH_TOLERANCE)
+            for (box, track), face, (name, distance) in zip(to_encode, encodings, matches):
+                track, new_visit = cam.tracker.assign(box, face, name, distance, track, now)
+                seen.append((track, new_visit))
+        if encoding:
+            metrics.observe("face_encoding", time.time() - started)
+    finally:
+        for _, _, job, _ in batch["rois"]:
+            job.close()
+
+    for track, new_visit in seen:
+        if new_visit and track.event is not None:
+            # Re-verification says this is someone else: close the previous
+            # person's visit so the new one gets its own event and fingerprint window.
+            end_visit(track)
+            track.event = None
+            track.best_score = -1.0
+        score = face_quality(frame_bgr, track.box)
+        if score > track.best_score:
+            track.best_score = score
+            track.best_frame = frame_bgr
+        if new_visit:
+            start_visit(cam, track, frame_bgr)
+
+def detect_faces(cam):
+    last_motion_seq = 0
+    last_submit = 0.0
+    # Frames whose faces are still being located, oldest first. Up to one per
+    # worker stays in flight, so even a single camera keeps the pool busy;
+    # results are applied in capture order so the tracker sees frames in sequence.
+    in_flight = deque()
     while True:
-        if picam2 and PI_HARDWARE_AVAILABLE:
+        metrics.heartbeat(f"faces-{cam.name}")
+        if cam.camera and cam.available:
             try:
-                frame = picam2.capture_array()
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                face_locations = face_recognition.face_locations(rgb_frame)
-                face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-
-                for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-                    matches = face_recognition.compare_faces(known_face_encodings, face_encoding, tolerance=0.5)
-                    name = "Unknown"
-                    if True in matches:
-                        name = known_face_names[matches.index(True)]
-
-                    timestamp = datetime.now().isoformat()
-                    img_filename = f"static/images/{timestamp.replace(':', '-')}.jpg"
-                    frame_bgr = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2BGR)
-                    cv2.imwrite(img_filename, frame_bgr)
-
-                    logger.info(f"Face detected: {name} at {timestamp}")
-
-                    # Only proceed if it's a known face
-                    if name != "Unknown":
-                        with pending_lock:
-                            pending_verification = {
-                                "name": name,
-                                "timestamp": timestamp
-                            }
-                        logger.info(f"{name} recognized. Awaiting fingerprint for unlock.")
-
-                        with detection_lock:
-                            latest_detections.insert(0, {
-                                "name": name,
-                                "timestamp": timestamp,
-                                "image": f"/{img_filename}",
-                                "video": None,
-                                "awaiting_fingerprint": True
-                            })
-
-                    # Send push notification regardless
-                    if EXPO_DEVICE_PUSH_TOKEN:
-                        detection_entry = {
-                            "name": name,
-                            "timestamp": timestamp,
-                            "image": f"/{img_filename}",
-                            "video": None
-                        }
-                        send_push_notification(EXPO_DEVICE_PUSH_TOKEN, detection_entry)
+                for track in cam.tracker.expire():
+                    end_visit(track)
+                # Sleep until the motion stage reports activity, or only briefly
+                # while frames are in flight; with motion detection switched off,
+                # fall back to a periodic full-frame scan.
+                with cam.motion_cond:
+                    cam.motion_cond.wait_for(lambda: cam.motion_seq > last_motion_seq,
+                                             timeout=FACE_POLL_INTERVAL if in_flight else FACE_FALLBACK_INTERVAL)
+                    seq, boxes = cam.motion_seq, cam.motion_regions
+                fallback_due = not motion_detection_enabled and time.time() - last_submit >= FACE_FALLBACK_INTERVAL
+                if (seq > last_motion_seq or fallback_due) and len(in_flight) < recognition_engine.workers:
+                    last_motion_seq, last_submit = seq, time.time()
+                    _, frame, _ = cam.bus.latest_copy()
+                    if frame is not None:
+                        batch = submit_faces(cam, frame, boxes, 0.0 if in_flight else FACE_SLOT_WAIT)
+                        if batch is not None:
+                            in_flight.append(batch)
+                while in_flight and (batch_located(in_flight[0]) or len(in_flight) >= recognition_engine.workers):
+                    finish_faces(cam, in_flight.popleft())
 
             except Exception as e:
-                logger.error(f"Face detection error: {e}")
-
-        time.sleep(2)
+                logger.error(f"Face detection error ({cam.name}): {e}")
+                time.sleep(1)
+        else:
+            time.sleep(2)
 
 
 def fingerprint_verification_loop():
-    import serial
-
-    OK = adafruit_fingerprint.OK
-
-    global pending_verification
-    try:
-        uart = serial.Serial("/dev/ttyAMA0", baudrate=57600, timeout=1)
-        finger = Adafruit_Fingerprint(uart)
-    except Exception as e:
-        logger.error(f"Fingerprint sensor init failed: {e}")
-        return
-
     while True:
-        time.sleep(1)
-
-        with pending_lock:
-            if not pending_verification:
-                continue
-            expected_name = pending_verification["name"]
-            timestamp_str = pending_verification["timestamp"]
-
-        try:
-            ts = datetime.fromisoformat(timestamp_str)
-            if (datetime.now() - ts).total_seconds() > 30:
-                logger.warning("Fingerprint timeout — clearing pending verification.")
-                with pending_lock:
-                    pending_verification = None
+        metrics.heartbeat("fingerprint")
+        # Woken by set_pending_verification() the moment a face is recognised;
+        # the timeout only keeps the heartbeat fresh while idle.
+        with pending_cond:
+            if not pending_cond.wait_for(lambda: pending_verification is not None, timeout=HEARTBEAT_INTERVAL):
                 continue
-        except Exception as e:
-            logger.error(f"Timestamp parse error: {e}")
+            pending = pending_verification
+        expected_name = pending["name"]
+        handoff_wakeups.append(time.time() - pending["recognized_at"])
+        deadline = pending["recognized_at"] + FINGERPRINT_WINDOW_SECONDS
+        read_errors = 0
+
+        # Poll the sensor at a bounded rate until the window closes, the
+        # finger matches, or a newer recognition replaces this one.
+        while time.time() < deadline:
+            metrics.heartbeat("fingerprint")
             with pending_lock:
-                pending_verification = None
-            continue
-
-        if finger.get_image() != OK:
-            continue
-        if finger.image_2_tz(1) != OK:
-            continue
-        if finger.finger_search() != OK:
-            continue
-
-        fingerprint_id = str(finger.finger_id)
-        matched_name = fingerprint_map.get(fingerprint_id)
+                if pending_verification is not pending:
+                    break
+            started = time.time()
+            try:
+                with metrics.time("fingerprint"):
+                    status, fingerprint_id = fingerprint_sensor.verify().result(timeout=10)
+            except Exception as e:
+                # An unavailable sensor fails every read, so report it once per
+                # window and back off rather than logging every second.
+                if read_errors == 0:
+                    logger.error(f"Fingerprint read error: {e}")
+                else:
+                    logger.debug(f"Fingerprint read error ({read_errors + 1} this window): {e}")
+                time.sleep(min(2 ** read_errors, 5, max(0.0, deadline - time.time())))
+                read_errors += 1
+                continue
 
-        if matched_name == expected_name:
-            logger.info(f"Fingerprint verified for {matched_name}. Unlocking.")
-            Thread(target=unlock_lock_for_seconds, args=(5,), daemon=True).start()
-            with pending_lock:
-                pending_verification = None
+            if status == "ok":
+                matched_name = fingerprint_map.get(str(fingerprint_id))
+                if matched_name == expected_name:
+                    latency = time.time() - pending["recognized_at"]
+                    handoff_unlocks.append(latency)
+                    logger.info(f"Fingerprint verified for {matched_name} {latency:.2f}s after recognition. Unlocking.")
+                    Thread(target=unlock_lock_for_seconds, args=(5,), daemon=True).start()
+                    set_pending_verification(None, "verified")
+                    break
+                logger.warning(f"Fingerprint mismatch: expected {expected_name}, got {matched_name}")
+                time.sleep(1)
+            time.sleep(max(0.0, FINGERPRINT_POLL_INTERVAL - (time.time() - started)))
         else:
-            logger.warning(f"Fingerprint mismatch: expected {expected_name}, got {matched_name}")
+            with pending_lock:
+                expired = pending_verification is pending
+            if expired:
+                logger.warning("Fingerprint timeout — clearing pending verification.")
+                set_pending_verification(None, "timeout")
 
 
 
-def send_push_notification(token, alert):
-    message = {
-        'to': token,
-        'sound': 'default',
-        'title': f'{alert["name"]} Detected!',
-        'body': f"At {alert['timestamp']}",
-        'data': alert
+def latency_summary(samples):
+    values = sorted(samples)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "last": round(samples[-1], 3),
+        "mean": round(sum(values) / len(values), 3),
+        "p50": round(values[len(values) // 2], 3),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
     }
-    try:
-        requests.post(EXPO_PUSH_ENDPOINT, json=message)
-        logger.info("Push notification sent")
-    except Exception as e:
-        logger.error(f"Push error: {e}")
 
 @app.route('/static/videos/<path:filename>')
 def serve_video(filename):
-    return send_file(os.path.join("static/videos", filename), mimetype='video/x-msvideo')
+    return send_media("static/videos", filename)
+
+@app.route('/static/images/<path:filename>')
+def serve_image(filename):
+    return send_media("static/images", filename)
+
+@app.route('/thumbs/<kind>/<path:filename>')
+def serve_thumbnail(kind, filename):
+    return thumbnails.send(kind, filename)
 
 @app.route('/auth_status')
 def auth_status():
     with pending_lock:
-        if pending_verification:
-            return jsonify({"awaiting_fingerprint": True, "name": pending_verification["name"]})
-        return jsonify({"awaiting_fingerprint": False})
+        return jsonify(auth_status_payload(pending_verification))
+
+@app.route('/handoff_stats')
+def handoff_stats():
+    return jsonify({
+        "status": "success",
+        "recognition_to_wakeup": latency_summary(list(handoff_wakeups)),
+        "recognition_to_unlock": latency_summary(list(handoff_unlocks))
+    })
+
+@app.route('/events')
+def events_stream():
+    # Resume from the EventSource Last-Event-ID header, ?since=, or start live.
+    since = request.headers.get('Last-Event-ID', request.args.get('since'))
+    seq = int(since) if since and since.isdigit() else change_feed.seq
+    response = Response(change_feed.sse(seq), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/events/poll')
+def events_poll():
+    since = request.args.get('since', type=int)
+    if since is None:
+        with pending_lock:
+            status = auth_status_payload(pending_verification)
+        return jsonify({"status": "success", "seq": change_feed.seq, "changes": [], "auth_status": status})
+    timeout = min(request.args.get('timeout', 25, type=float), 60)
+    changes = change_feed.wait(since, timeout)
+    if changes is None:
+        return jsonify({"status": "resync", "seq": change_feed.seq, "changes": []})
+    seq = changes[-1]["seq"] if changes else since
+    return jsonify({"status": "success", "seq": seq, "changes": changes})
 
 
 @app.route('/enroll_fingerprint', methods=['POST'])
 def enroll_fingerprint():
-    import serial
-
-    OK = adafruit_fingerprint.OK
-    NOFINGER = adafruit_fingerprint.NOFINGER
-    IMAGEFAIL = adafruit_fingerprint.IMAGEFAIL
-
     username = request.form.get("name")
     if not username:
         return jsonify({"status": "error", "message": "Name required"}), 400
 
     try:
-        uart = serial.Serial("/dev/ttyAMA0", baudrate=57600, timeout=1)
-        finger = Adafruit_Fingerprint(uart)
-
         logger.info("Enrolling fingerprint for user: %s", username)
-
-        for img_num in [1, 2]:
-            logger.info("Step %d: Place finger on sensor...", img_num)
-            while True:
-                result = finger.get_image()
-                if result == OK:
-                    break
-                elif result == NOFINGER:
-                    time.sleep(0.5)
-                elif result == IMAGEFAIL:
-                    return jsonify({"status": "error", "message": "Imaging error"}), 500
-                else:
-                    return jsonify({"status": "error", "message": "Unknown image error"}), 500
-
-            if finger.image_2_tz(img_num) != OK:
-                return jsonify({"status": "error", "message": f"Templating failed at step {img_num}"}), 500
-
-            if img_num == 1:
-                logger.info("Remove finger...")
-                while finger.get_image() != NOFINGER:
-                    time.sleep(0.5)
-
-        if finger.create_model() != OK:
-            return jsonify({"status": "error", "message": "Fingerprints did not match"}), 500
-
-        used_ids = finger.templates or []
-        position = next((i for i in range(1, 128) if i not in used_ids), None)
-        if position is None:
-            return jsonify({"status": "error", "message": "No available fingerprint slots"}), 500
-
-        if finger.store_model(position) != OK:
-            return jsonify({"status": "error", "message": "Failed to store fingerprint"}), 500
+        position = fingerprint_sensor.enroll(timeout=30).result(timeout=60)
 
         fingerprint_map[str(position)] = username
         save_fingerprint_map()
@@ -371,6 +729,8 @@ def enroll_fingerprint():
             "fingerprint_id": position
         })
 
+    except FingerprintError as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
     except Exception as e:
         logger.error("Enrollment error: %s", e)
         return jsonify({"status": "error", "message": "Enrollment failed"}), 500
@@ -378,17 +738,13 @@ def enroll_fingerprint():
 @app.route('/fingerprints', methods=['GET'])
 def list_fingerprints():
     try:
-        import serial
-        from adafruit_fingerprint import Adafruit_Fingerprint
-
-        uart = serial.Serial("/dev/ttyAMA0", baudrate=57600, timeout=1)
-        finger = Adafruit_Fingerprint(uart)
-
-        if finger.read_templates() != adafruit_fingerprint.OK:
-            return jsonify({"status": "error", "message": "Failed to read templates"}), 500
+        # Served from the sensor's slot cache; ?refresh=1 forces a re-read.
+        templates = fingerprint_sensor.templates()
+        if templates is None or request.args.get('refresh') == '1':
+            templates = fingerprint_sensor.refresh_templates().result(timeout=10)
 
         fingerprints = []
-        for fid in finger.templates:
+        for fid in templates:
             name = fingerprint_map.get(str(fid), "Unknown")
             fingerprints.append({"id": str(fid), "name": name})
 
@@ -400,36 +756,113 @@ def list_fingerprints():
 @app.route('/delete_fingerprint/<fid>', methods=['DELETE'])
 def delete_fingerprint(fid):
     try:
-        import serial
-        from adafruit_fingerprint import Adafruit_Fingerprint
-
-        uart = serial.Serial("/dev/ttyAMA0", baudrate=57600, timeout=1)
-        finger = Adafruit_Fingerprint(uart)
-
-        if finger.delete_model(int(fid)) == adafruit_fingerprint.OK:
-            fingerprint_map.pop(str(fid), None)
-            save_fingerprint_map()
-            return jsonify({"status": "success", "message": f"Fingerprint ID {fid} deleted"})
-        else:
-            return jsonify({"status": "error", "message": "Failed to delete fingerprint"}), 500
+        fingerprint_sensor.delete(int(fid)).result(timeout=10)
+        fingerprint_map.pop(str(fid), None)
+        save_fingerprint_map()
+        return jsonify({"status": "success", "message": f"Fingerprint ID {fid} deleted"})
+    except FingerprintError as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
 @app.route('/')
 def home():
-    return 'Face & Motion Detection Server Running'
+    # The app only checks for a 200 here; the body says how far startup has got.
+    return jsonify({
+        "status": "success",
+        "message": "Face & Motion Detection Server Running",
+        "ready": all(startup_phases.values()),
+        "phases": startup_phases
+    })
+
+def camera_not_found(name):
+    return jsonify({"status": "error", "message": f"Unknown camera '{name}'"}), 404
+
+@app.route('/cameras')
+def list_cameras():
+    return jsonify({"status": "success", "default": DEFAULT_CAMERA, "cameras": [cam.status() for cam in cameras.values()]})
 
 @app.route('/video_feed')
-def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+@app.route('/video_feed/<name>')
+def video_feed(name=None):
+    cam = get_camera(name)
+    if cam is None:
+        return camera_not_found(name)
+    try:
+        tier = cam.broadcaster.resolve_tier(request.args.get('tier'), request.args.get('width'),
+                                            request.args.get('quality'), request.args.get('fps'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return Response(cam.broadcaster.stream(tier), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+def parse_time(value):
+    """Epoch seconds, or an ISO 8601 local time like the event timestamps."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@app.route('/clips')
+def get_clip():
+    """Recorded footage from `from` to `to` as an MJPEG AVI. The segments
+    already hold the stream's JPEGs, so they are copied into the container
+    without re-encoding. VLC, ffmpeg and desktop players open the file;
+    browsers and the Expo video player don't decode MJPEG, so it is a download
+    or an input for ffmpeg there, not something to play inline."""
+    name = request.args.get('camera')
+    cam = get_camera(name)
+    if cam is None:
+        return camera_not_found(name)
+    if cam.dvr is None:
+        return jsonify({"status": "error", "message": f"DVR recording is off for '{cam.name}'"}), 404
+    try:
+        start = parse_time(request.args['from'])
+        end = parse_time(request.args['to']) if request.args.get('to') else time.time()
+    except (KeyError, ValueError):
+        return jsonify({"status": "error", "message": "from and to must be epoch seconds or ISO 8601 times"}), 400
+    if not 0 < end - start <= DVR_MAX_CLIP_SECONDS:
+        return jsonify({"status": "error", "message": f"Range must be positive and at most {DVR_MAX_CLIP_SECONDS}s"}), 400
+    clip = segment_index.find_clip(cam.name, start, end)
+    if not clip["frames"]:
+        return jsonify({"status": "error", "message": "No recorded footage in that range"}), 404
+    size, chunks = avi_clip(clip)
+    response = Response(chunks, mimetype='video/x-msvideo')
+    filename = f"{cam.name}-{datetime.fromtimestamp(clip['start']).strftime('%Y%m%d-%H%M%S')}.avi"
+    response.headers['Content-Length'] = str(size)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Clip-Start'] = str(clip["start"])
+    response.headers['X-Clip-End'] = str(clip["end"])
+    response.headers['X-Clip-Frames'] = str(clip["frames"])
+    return response
+
+@app.route('/storage')
+def storage_status():
+    return jsonify({"status": "success", **retention.stats()})
+
+@app.route('/snapshot')
+@app.route('/snapshot/<name>')
+def snapshot(name=None):
+    cam = get_camera(name)
+    if cam is None:
+        return camera_not_found(name)
+    jpeg = cam.broadcaster.snapshot()
+    if jpeg is None:
+        return jsonify({"status": "error", "message": "Camera not available"}), 503
+    response = Response(jpeg, mimetype='image/jpeg')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 @app.route('/view')
-def view():
-    return """
+@app.route('/view/<name>')
+def view(name=None):
+    cam = get_camera(name)
+    if cam is None:
+        return camera_not_found(name)
+    return f"""
     <html><head><link rel='icon' href='/favicon.ico' /></head>
     <body style="margin:0;background:#fff;">
-    <img src="/video_feed" style="width:100vw;height:100vh;object-fit:contain;" />
+    <img src="/video_feed/{cam.name}" style="width:100vw;height:100vh;object-fit:contain;" />
     </body></html>
     """
 
@@ -445,7 +878,44 @@ def toggle_motion():
 
 @app.route('/motion_status', methods=['GET'])
 def motion_status():
-    return jsonify({"motion_enabled": motion_detection_enabled})
+    # Top-level recorder/preroll describe ?camera= (or the default camera).
+    name = request.args.get('camera')
+    cam = get_camera(name)
+    if cam is None:
+        return camera_not_found(name)
+    return jsonify({
+        "motion_enabled": motion_detection_enabled,
+        "camera": cam.name,
+        "recorder": cam.recorder.stats(),
+        "preroll": cam.preroll.stats(),
+        "cameras": {n: {"recorder": c.recorder.stats(), "preroll": c.preroll.stats()} for n, c in cameras.items()}
+    })
+
+
+@app.route('/motion_config', methods=['GET', 'POST'])
+def motion_config_endpoint():
+    name = request.args.get('camera')
+    cam = get_camera(name)
+    if cam is None:
+        return camera_not_found(name)
+    config = camera_motion_config(cam.name)
+    if request.method == 'GET':
+        return jsonify({"status": "success", "camera": cam.name, "config": config})
+    data = request.get_json() or {}
+    sensitivity = data.get("sensitivity", config["sensitivity"])
+    zones = data.get("zones", config["zones"])
+    try:
+        sensitivity = float(sensitivity)
+        zones = [[(float(x), float(y)) for x, y in zone] for zone in zones]
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "Invalid request"}), 400
+    config.update(sensitivity=min(max(sensitivity, 0.0), 1.0), zones=zones)
+    motion_config["cameras"][cam.name] = config
+    cam.motion.set_sensitivity(config["sensitivity"])
+    cam.motion.set_zones(zones)
+    with open(MOTION_CONFIG_FILE, "w") as f:
+        json.dump(motion_config, f)
+    return jsonify({"status": "success", "camera": cam.name, "config": config})
 
 
 @app.route('/favicon.ico')
@@ -454,21 +924,62 @@ def favicon():
 
 @app.route('/dataset/<path:filename>')
 def serve_dataset(filename):
-    return send_from_directory('dataset', filename)
+    return send_media('dataset', filename, max_age=3600)
 
 @app.route('/users', methods=['GET'])
 def list_users():
-    users = {}
-    for person in os.listdir('dataset'):
-        path = os.path.join('dataset', person)
-        if os.path.isdir(path):
-            users[person] = [f"/dataset/{person}/{img}" for img in os.listdir(path)]
-    return jsonify(users)
+    people = dataset_index.people()
+    page = request.args.get('page', type=int)
+    if page is None:
+        # Original shape: {name: [image urls]}
+        return jsonify({person: [f"/dataset/{person}/{img}" for img in images] for person, images in people.items()})
+    if page < 1:
+        return jsonify({"status": "error", "message": "page starts at 1"}), 400
+
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), 100))
+    names = list(people)
+    users = []
+    for person in names[(page - 1) * per_page:page * per_page]:
+        images = []
+        counts = {"encoded": 0, "no_face": 0, "pending": 0}
+        for img in people[person]:
+            status, faces = encoding_cache.status(os.path.join("dataset", person, img))
+            counts[status] += 1
+            images.append({
+                "url": f"/dataset/{person}/{img}",
+                "thumbnail": thumbnails.url_for("dataset", f"{person}/{img}"),
+                "status": status,
+                "faces": faces
+            })
+        users.append({"name": person, "image_count": len(images), "encoding": counts, "images": images})
+    return jsonify({
+        "status": "success",
+        "users": users,
+        "page": page,
+        "per_page": per_page,
+        "total": len(names),
+        "pages": (len(names) + per_page - 1) // per_page,
+        "retrain": retrain_scheduler.status()["state"]
+    })
 
 @app.route('/detect', methods=['GET'])
 def get_detections():
-    with detection_lock:
-        return jsonify({"status": "success", "detected_faces": latest_detections})
+    try:
+        since = request.args.get('since', type=int)
+        cursor = request.args.get('cursor', type=int)
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        events, next_cursor = event_store.query(
+            since=since, cursor=cursor, limit=limit, event_type=request.args.get('type'),
+            name=request.args.get('name'), camera=request.args.get('camera'))
+    except Exception as e:
+        logger.error(f"Detection query error: {e}")
+        return jsonify({"status": "error", "message": "Query failed"}), 500
+    return jsonify({
+        "status": "success",
+        "detected_faces": events,
+        "next_cursor": next_cursor,
+        "latest_id": events[0]["id"] if events else since
+    })
 
 @app.route('/delete_user/<name>', methods=['DELETE'])
 def delete_user(name):
@@ -478,7 +989,9 @@ def delete_user(name):
             for file in os.listdir(folder):
                 os.remove(os.path.join(folder, file))
             os.rmdir(folder)
-            Thread(target=retrain_encodings, daemon=True).start()
+            shutil.rmtree(os.path.join("static/thumbs/dataset", name), ignore_errors=True)
+            dataset_index.invalidate(name)
+            retrain_scheduler.request()
             return jsonify({"status": "success", "message": f"User '{name}' deleted."})
         else:
             return jsonify({"status": "error", "message": "User not found"}), 404
@@ -488,14 +1001,23 @@ def delete_user(name):
 
 @app.route('/register_token', methods=['POST'])
 def register_token():
-    global EXPO_DEVICE_PUSH_TOKEN
     data = request.get_json()
     token = data.get('token')
     if token:
-        EXPO_DEVICE_PUSH_TOKEN = token
+        push_dispatcher.add_token(token)
         return jsonify({"status": "success", "message": "Token registered"})
     return jsonify({"status": "error", "message": "No token"}), 400
 
+@app.route('/unregister_token', methods=['POST'])
+def unregister_token():
+    data = request.get_json()
+    token = data.get('token')
+    if not token:
+        return jsonify({"status": "error", "message": "No token"}), 400
+    if push_dispatcher.remove_token(token):
+        return jsonify({"status": "success", "message": "Token removed"})
+    return jsonify({"status": "error", "message": "Token not registered"}), 404
+
 @app.route('/unlock', methods=['POST'])
 def unlock_door():
     Thread(target=unlock_lock_for_seconds, args=(5,), daemon=True).start()
@@ -508,29 +1030,22 @@ def lock_door():
 
 @app.route('/verify_fingerprint', methods=['POST'])
 def verify_fingerprint():
-    import serial
-
-    OK = adafruit_fingerprint.OK
-
     face_name = request.json.get("name")
     if not face_name:
         return jsonify({"status": "error", "message": "Missing face name"}), 400
 
     try:
-        uart = serial.Serial("/dev/ttyAMA0", baudrate=57600, timeout=1)
-        finger = Adafruit_Fingerprint(uart)
-
         logger.info("Place finger to verify %s...", face_name)
 
-        if finger.get_image() != OK:
+        status, fingerprint_id = fingerprint_sensor.verify().result(timeout=10)
+        if status == "no_finger":
             return jsonify({"status": "error", "message": "Failed to capture fingerprint"}), 400
-        if finger.image_2_tz(1) != OK:
+        if status == "convert_failed":
             return jsonify({"status": "error", "message": "Failed to convert image"}), 400
-        if finger.finger_search() != OK:
+        if status == "not_found":
             return jsonify({"status": "error", "message": "Fingerprint not recognized"}), 404
 
-        fingerprint_id = str(finger.finger_id)
-        matched_name = fingerprint_map.get(fingerprint_id)
+        matched_name = fingerprint_map.get(str(fingerprint_id))
 
         if matched_name != face_name:
             logger.warning("Mismatch: expected %s, got %s", face_name, matched_name)
@@ -559,7 +1074,8 @@ def register_face():
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S%f")
         path = os.path.join(folder, f"{name}_{timestamp}.jpg")
         file.save(path)
-    Thread(target=retrain_encodings, daemon=True).start()
+    dataset_index.invalidate(name)
+    retrain_scheduler.request()
     return jsonify({"status": "success", "message": f"{len(files)} images saved. Training started."})
 
 @app.route('/capture_face', methods=['POST'])
@@ -567,66 +1083,50 @@ def capture_face():
     name = request.form.get('name')
     if not name:
         return jsonify({"status": "error", "message": "Name is required"}), 400
+    cam = get_camera(request.form.get('camera'))
+    if cam is None:
+        return camera_not_found(request.form.get('camera'))
     try:
         folder = os.path.join("dataset", name)
         os.makedirs(folder, exist_ok=True)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S%f")
         filename = f"{name}_{timestamp}.jpg"
         path = os.path.join(folder, filename)
-        if picam2 and PI_HARDWARE_AVAILABLE:
-            frame = picam2.capture_array()
+        _, frame, _ = cam.bus.latest_copy()
+        if cam.camera and cam.available and frame is not None:
             cv2.imwrite(path, frame)
+            thumbnails.write("dataset", f"{name}/{filename}", frame)
             logger.info(f"Captured image for {name}: {filename}")
         else:
             return jsonify({"status": "error", "message": "Camera not available"}), 500
-        Thread(target=retrain_encodings, daemon=True).start()
+        dataset_index.invalidate(name)
+        retrain_scheduler.request()
         return jsonify({"status": "success", "message": f"Photo captured and saved as {filename}."})
     except Exception as e:
         logger.error(f"Capture error: {e}")
         return jsonify({"status": "error", "message": "Failed to capture image"}), 500
 
-def retrain_encodings():
-    try:
-        logger.info("Retraining encodings...")
-        imagePaths = list(paths.list_images("dataset"))
-        encodings = []
-        names = []
-        for path in imagePaths:
-            name = path.split(os.path.sep)[-2]
-            image = cv2.imread(path)
-            rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            boxes = face_recognition.face_locations(rgb, model="hog")
-            for enc in face_recognition.face_encodings(rgb, boxes):
-                encodings.append(enc)
-                names.append(name)
-        data = {"encodings": encodings, "names": names}
-        with open("encodings.pickle", "wb") as f:
-            pickle.dump(data, f)
-        global known_face_encodings, known_face_names
-        known_face_encodings = data["encodings"]
-        known_face_names = data["names"]
-        logger.info("Retraining complete")
-    except Exception as e:
-        logger.error(f"Retraining failed: {e}")
+def retrain_encodings(progress=None):
+    global face_index
+    from imutils import paths
+    logger.info("Retraining encodings...")
+    imagePaths = list(paths.list_images("dataset"))
+    stats = encoding_cache.refresh(imagePaths, progress=progress)
+    encoding_store.save(*encoding_cache.encodings_and_names())
+    matrix, names = encoding_store.load()
+    face_index = FaceIndex(matrix, names, use_centroids=FACE_MATCH_CENTROIDS)
+    logger.info(f"Retraining complete: {stats}")
+    return stats
 
-def generate_frames():
-    global last_encoded_frame
-    while True:
-        try:
-            if picam2:
-                frame = picam2.capture_array()
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
-                with detection_lock:
-                    frame_buffer.append(frame_bgr)
-                ret, buffer = cv2.imencode('.jpg', frame_rgb, [int(cv2.IMWRITE_JPEG_QUALITY), 50])
-                if ret:
-                    last_encoded_frame = buffer.tobytes()
-                    yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + last_encoded_frame + b'\r\n')
-            time.sleep(0.05)
-        except Exception as e:
-            logger.error(f"Frame generation error: {e}")
-            time.sleep(1)
+retrain_scheduler = RetrainScheduler(retrain_encodings, debounce=2.0)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/retrain_status', methods=['GET'])
+def retrain_status():
+    return jsonify({"status": "success", "retrain": retrain_scheduler.status()})
 
 @app.after_request
 def after_request(response):
@@ -634,12 +1134,59 @@ def after_request(response):
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
     return response
 
-if __name__ == '__main__':
-    initialize_hardware()
+def start_worker(name, target):
+    thread = Thread(target=target, name=name, daemon=True)
+    thread.start()
+    metrics.watch(name, thread)
+    return thread
+
+def start_camera(cam):
+    cam.open()
+    start_worker(f"capture-{cam.name}", lambda: capture_frames(cam))
+    cam.broadcaster.start()
+    cam.recorder.start()
+    if cam.dvr is not None:
+        cam.dvr.start()
+    start_worker(f"motion-{cam.name}", lambda: detect_motion(cam))
+
+def start_pipeline():
+    for cam in cameras.values():
+        start_camera(cam)
+    if any(cam.available for cam in cameras.values()):
+        mark_ready("camera")
+    load_encodings()
+    retrain_scheduler.start()
+    try:
+        recognition_engine.wait_ready(timeout=300)
+    except Exception as e:
+        logger.error(f"Recognition workers failed to start: {e}")
+        return
+    mark_ready("recognition")
+    # Brings the encoding cache in line with the dataset, so /users reports
+    # real statuses on an install that predates the cache. Images the cache
+    # already has are skipped, so this is cheap on later starts.
+    retrain_scheduler.request()
+    # One face loop per camera, all sharing the recognition pool.
+    for cam in cameras.values():
+        start_worker(f"faces-{cam.name}", lambda cam=cam: detect_faces(cam))
+
+def start_background_workers():
+    # Fork the recognition workers while the process is still single-threaded;
+    # they load dlib's models in their own initializer, not in this process.
+    recognition_engine.start()
+    initialize_lock()
     lock_immediately()
-    Thread(target=detect_motion, daemon=True).start()
-    Thread(target=detect_faces, daemon=True).start()
-    Thread(target=fingerprint_verification_loop, daemon=True).start()  # NEW
+    if GPIO is not None:
+        mark_ready("lock")
+    event_store.start()
+    push_dispatcher.start()
+    retention.start()
+    fingerprint_sensor.start()
+    start_worker("fingerprint", fingerprint_verification_loop)
+    Thread(target=start_pipeline, name="startup", daemon=True).start()
+
+if __name__ == '__main__':
+    start_background_workers()
     app.run(host='0.0.0.0', port=5000, threaded=True)
 
 
@@ -0,0 +1,130 @@
+import threading
+import time
+
+import pytest
+
+from fingerprint_sensor import PRIORITY_VERIFY, FakeFingerprint, FingerprintError, FingerprintSensor
+
+
+class CountingFingerprint(FakeFingerprint):
+    def __init__(self, templates=None):
+        super().__init__(templates)
+        self.template_reads = 0
+
+    def read_templates(self):
+        self.template_reads += 1
+        return super().read_templates()
+
+
+def start_sensor(device):
+    sensor = FingerprintSensor(lambda: device).start()
+    sensor.refresh_templates().result(timeout=5)
+    return sensor
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.01)
+
+
+def test_verify_matches_stored_template():
+    device = FakeFingerprint({3: "alice"})
+    sensor = start_sensor(device)
+
+    assert sensor.verify().result(timeout=5) == ("no_finger", None)
+    device.place_finger("alice")
+    assert sensor.verify().result(timeout=5) == ("ok", 3)
+    device.place_finger("mallory")
+    assert sensor.verify().result(timeout=5) == ("not_found", None)
+
+
+def test_enroll_stores_in_first_free_slot_and_updates_cache():
+    device = CountingFingerprint({1: "alice"})
+    sensor = start_sensor(device)
+    reads = device.template_reads
+
+    def touch_twice():
+        device.place_finger("bob")
+        wait_until(lambda: device._buffers.get(1) == "bob")
+        device.remove_finger()
+        time.sleep(0.3)
+        device.place_finger("bob")
+
+    threading.Thread(target=touch_twice, daemon=True).start()
+    assert sensor.enroll(timeout=5).result(timeout=10) == 2
+    assert device.stored[2] == "bob"
+    # The cache is updated in place rather than re-read from the sensor.
+    assert sensor.templates() == [1, 2]
+    assert device.template_reads == reads
+
+    sensor.delete(1).result(timeout=5)
+    assert sensor.templates() == [2]
+    assert device.template_reads == reads
+
+
+def test_verify_preempts_queued_enroll():
+    device = FakeFingerprint({3: "alice"})
+    sensor = start_sensor(device)
+    gate = threading.Event()
+    finished = []
+
+    # Hold the worker so both commands are queued before either runs.
+    busy = sensor.submit(lambda finger: gate.wait(5))
+    enroll = sensor.enroll(timeout=0.3)
+    verify = sensor.verify(PRIORITY_VERIFY)
+    enroll.add_done_callback(lambda f: finished.append("enroll"))
+    verify.add_done_callback(lambda f: finished.append("verify"))
+    device.place_finger("alice")
+    gate.set()
+
+    assert busy.result(timeout=5)
+    assert verify.result(timeout=5) == ("ok", 3)
+    # The finger never leaves the glass, so enroll times out after verify ran.
+    with pytest.raises(FingerprintError):
+        enroll.result(timeout=5)
+    assert finished == ["verify", "enroll"]
+
+
+def test_commands_fail_when_sensor_is_unavailable():
+    def broken():
+        raise OSError("no UART")
+
+    sensor = FingerprintSensor(broken).start()
+    with pytest.raises(FingerprintError):
+        sensor.verify().result(timeout=5)
+    assert not sensor.available
+
+
+def test_sensor_reopens_after_failed_init(monkeypatch):
+    monkeypatch.setattr("fingerprint_sensor.RETRY_MIN", 0.05)
+    device = FakeFingerprint({3: "alice"})
+    attempts = []
+
+    def flaky():
+        attempts.append(time.time())
+        if len(attempts) == 1:
+            raise OSError("no UART yet")
+        return device
+
+    sensor = FingerprintSensor(flaky).start()
+    with pytest.raises(FingerprintError):
+        sensor.verify().result(timeout=5)
+    time.sleep(0.1)
+    device.place_finger("alice")
+    assert sensor.verify().result(timeout=5) == ("ok", 3)
+    assert sensor.available and len(attempts) == 2
+
+
+def test_failed_template_read_keeps_sensor_open():
+    class NoTemplates(FakeFingerprint):
+        def read_templates(self):
+            return 0x01
+
+    device = NoTemplates({3: "alice"})
+    sensor = FingerprintSensor(lambda: device).start()
+    device.place_finger("alice")
+    assert sensor.verify().result(timeout=5) == ("ok", 3)
+    assert sensor.available and sensor.templates() is None
@@ -0,0 +1,126 @@
+import itertools
+import time
+
+import numpy as np
+
+from face_index import UNKNOWN
+
+
+def box_iou(a, b):
+    # Boxes use face_recognition's (top, right, bottom, left) order.
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return inter / float(area_a + area_b - inter)
+
+
+class Track:
+    def __init__(self, track_id, box, encoding, name, distance, now):
+        self.id = track_id
+        self.box = box
+        self.encoding = encoding
+        self.name = name
+        self.distance = distance
+        self.first_seen = now
+        self.last_seen = now
+        self.last_verified = now
+        self.hits = 1
+        self.encodings = 1
+        self.best_score = -1.0
+        self.best_frame = None
+        self.event = None
+        self.snapshot = None
+        self.snapshot_score = -1.0
+
+    @property
+    def known(self):
+        return self.name != UNKNOWN
+
+    def summary(self):
+        return {
+            "track_id": self.id,
+            "duration": round(self.last_seen - self.first_seen, 1),
+            "frames": self.hits,
+            "encodings": self.encodings,
+            "distance": None if self.distance is None else round(self.distance, 3),
+        }
+
+
+class FaceTracker:
+    """Associates detected faces across frames so each visit is handled once."""
+
+    def __init__(self, iou_threshold=0.3, max_distance=0.5, ttl=5.0, reverify_interval=3.0):
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.reverify_interval = reverify_interval
+        self.tracks = {}
+        self._ids = itertools.count(1)
+
+    def associate(self, boxes, now=None):
+        """Pairs each box with an overlapping track; returns (box, track) and
+        the boxes that still need an encoding because they are new or due for
+        re-verification."""
+        now = now or time.time()
+        pairs, to_encode, taken = [], [], set()
+        candidates = sorted(
+            ((box_iou(box, t.box), i, t) for i, box in enumerate(boxes) for t in self.tracks.values()),
+            key=lambda c: c[0], reverse=True,
+        )
+        matched = {}
+        for iou, i, track in candidates:
+            if iou < self.iou_threshold or i in matched or track.id in taken:
+                continue
+            matched[i] = track
+            taken.add(track.id)
+        for i, box in enumerate(boxes):
+            track = matched.get(i)
+            if track is not None and now - track.last_verified < self.reverify_interval:
+                track.box = box
+                track.last_seen = now
+                track.hits += 1
+                pairs.append((box, track))
+            else:
+                to_encode.append((box, track))
+        return pairs, to_encode
+
+    def assign(self, box, encoding, name, distance, track=None, now=None):
+        """Records an encoded face; returns the track and whether it is a new
+        visit, a visit whose person has just been recognised, or one that
+        re-verification has found to be somebody else."""
+        now = now or time.time()
+        if track is None:
+            track = self._closest(encoding)
+        created = track is None
+        if created:
+            track = Track(next(self._ids), box, encoding, name, distance, now)
+            self.tracks[track.id] = track
+            return track, True
+        previous = track.name if track.known else None
+        track.box = box
+        track.encoding = encoding
+        track.last_seen = track.last_verified = now
+        track.hits += 1
+        track.encodings += 1
+        if name != UNKNOWN or not track.known:
+            track.name, track.distance = name, distance
+        return track, track.known and track.name != previous
+
+    def _closest(self, encoding):
+        best, best_dist = None, self.max_distance
+        for track in self.tracks.values():
+            dist = float(np.linalg.norm(track.encoding - encoding))
+            if dist < best_dist:
+                best, best_dist = track, dist
+        return best
+
+    def expire(self, now=None):
+        now = now or time.time()
+        ended = [t for t in self.tracks.values() if now - t.last_seen > self.ttl]
+        for track in ended:
+            del self.tracks[track.id]
+        return ended